@@ -1,5 +1,29 @@
 from .helpers import mac_timestamp_to_iso
-from .db import get_db_connection
+from .db import get_db_connection, IDENTITY
+from .query import run_query, run_query_one, register_hot_query
+
+# Per-handle counts come straight off the message(handle_id, ...) index; all handles of a
+# person are folded afterwards through the identity index.
+TOP_CONTACT_SQL = register_hot_query("analytics.top_contact", f"""
+    SELECT SUM(t.cnt) as cnt, MIN(h.id) as handle, p.name
+    FROM (SELECT handle_id, COUNT(*) as cnt FROM message WHERE handle_id > 0 GROUP BY handle_id) t
+    JOIN {IDENTITY}.person_handle ph ON ph.handle_rowid = t.handle_id
+    JOIN handle h ON t.handle_id = h.ROWID
+    LEFT JOIN {IDENTITY}.person p ON p.person_id = ph.person_id
+    GROUP BY ph.person_id
+    ORDER BY cnt DESC
+    LIMIT 1
+    """)
+
+ACTIVITY_SQL = register_hot_query("analytics.activity_trend", """
+    SELECT m.date 
+    FROM message m
+    JOIN chat_message_join cmj ON m.ROWID = cmj.message_id
+    JOIN chat c ON cmj.chat_id = c.ROWID
+    WHERE c.guid = ?
+    ORDER BY m.date DESC
+    LIMIT 10000
+    """, ("chat-guid",))
 
 def get_global_stats():
     """Return high-level stats for the dashboard info cards."""
@@ -8,21 +32,16 @@ def get_global_stats():
     except Exception:
         return {"total_messages": 0, "total_chats": 0, "last_active": "N/A", "top_contact_handle": "N/A"}
     
-    cur = conn.cursor()
     stats = {}
     try:
-        cur.execute("SELECT COUNT(*) FROM message")
-        stats["total_messages"] = cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM chat")
-        stats["total_chats"] = cur.fetchone()[0]
-        cur.execute("SELECT MAX(date) FROM message")
-        last_ts = cur.fetchone()[0]
+        stats["total_messages"] = run_query_one(conn, "SELECT COUNT(*) FROM message", name="stats.total_messages")[0]
+        stats["total_chats"] = run_query_one(conn, "SELECT COUNT(*) FROM chat", name="stats.total_chats")[0]
+        last_ts = run_query_one(conn, "SELECT MAX(date) FROM message", name="stats.last_active")[0]
         stats["last_active"] = mac_timestamp_to_iso(last_ts)
-        sql_top = "SELECT count(*) as cnt, h.id FROM message m JOIN handle h ON m.handle_id = h.ROWID GROUP BY h.id ORDER BY cnt DESC LIMIT 1"
-        cur.execute(sql_top)
-        row = cur.fetchone()
-        stats["top_contact_handle"] = row[1] if row else "N/A"
-        stats["top_contact_count"] = row[0] if row else 0
+        row = run_query_one(conn, TOP_CONTACT_SQL, name="analytics.top_contact")
+        stats["top_contact_handle"] = row.handle if row else "N/A"
+        stats["top_contact_name"] = (row.name or row.handle) if row else "N/A"
+        stats["top_contact_count"] = row.cnt if row else 0
     except:
         stats = {"total_messages": 0, "total_chats": 0, "last_active": "N/A", "top_contact_handle": "N/A"}
     finally:
@@ -34,17 +53,7 @@ def get_chat_activity_trend(chat_guid, limit_days=30):
         conn = get_db_connection()
     except: return []
     
-    cur = conn.cursor()
-    sql = """
-    SELECT m.date 
-    FROM message m
-    JOIN chat_message_join cmj ON m.ROWID = cmj.message_id
-    JOIN chat c ON cmj.chat_id = c.ROWID
-    WHERE c.guid = ?
-    ORDER BY m.date DESC
-    LIMIT 10000
-    """
-    dates = [r[0] for r in cur.execute(sql, (chat_guid,))]
+    dates = [r[0] for r in run_query(conn, ACTIVITY_SQL, (chat_guid,), name="analytics.activity_trend")]
     conn.close()
     
     from collections import Counter
@@ -1,23 +1,27 @@
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, WebSocket, Request, Response
+from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, validator
-from typing import Optional, List
+from typing import Optional, List, Dict
 import sys
 import os
+import asyncio
 
 # Add project root to sys.path so 'backend' package is importable
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from backend.src import engine, db
+from backend.src import engine, db, thumbnails, query, verify
+from backend.src.watcher import MessageWatcher
 from backend.src.config import OUT_DIR
-from backend.src.helpers import decode_body, mac_timestamp_to_iso, redact_path
+from backend.src.helpers import redact_path
 
 def _safe_detail(err: Exception) -> str:
     detail = redact_path(str(err))
     return detail or "Internal error"
 
 app = FastAPI(title="Archiver API", version="1.0.0")
+watcher = MessageWatcher()
 
 # CORS - Allow local development
 app.add_middleware(
@@ -36,6 +40,13 @@ class Chat(BaseModel):
     last_date: Optional[str] = None
     badges: str
 
+class Person(BaseModel):
+    person_id: str
+    name: str
+    handles: List[str] # every phone/email of this person that has messages
+    msg_count: int
+    last_date: Optional[str] = None # ISO
+
 class Message(BaseModel):
     row_id: int
     text: str
@@ -43,12 +54,34 @@ class Message(BaseModel):
     date: str # ISO
     handle_id: Optional[int] = None
     sender_name: Optional[str] = None
+    guid: Optional[str] = None
+    reaction_type: str = "" # set on tapback rows
+    reaction_target: str = "" # guid of the message a tapback applies to
+    reactions: Dict[str, List[str]] = {} # standing tapbacks on this message: label -> senders
+    thread_id: str = "" # thread root guid for inline replies and their originator
+
+class Attachment(BaseModel):
+    attachment_id: int
+    guid: Optional[str] = None
+    message_row_id: int
+    date: str # ISO
+    mime_type: Optional[str] = None
+    transfer_name: Optional[str] = None
+    total_bytes: int
+    is_from_me: bool
+    thumbnail_url: str
+
+class AttachmentPage(BaseModel):
+    items: List[Attachment]
+    next_cursor: Optional[str] = None
 
 class GlobalStats(BaseModel):
     total_messages: int
     total_chats: int
     top_contact_handle: str
     top_contact_count: int
+    top_contact_name: str
+    top_contact_person_id: Optional[str] = None
     storage_path: str
 
 class OnboardingCheckResponse(BaseModel):
@@ -59,6 +92,8 @@ class ArchiveRequest(BaseModel):
     chat_guid: str
     format: str = "csv" # csv, json, md
     incremental: bool = True
+    compression: Optional[str] = None # none, gzip, zstd (defaults to EXPORT_COMPRESSION)
+    shard_mb: Optional[int] = None # part size cap in MB, 0 disables (defaults to EXPORT_SHARD_MB)
 
     @validator("format")
     def validate_format(cls, v):
@@ -67,12 +102,52 @@ class ArchiveRequest(BaseModel):
             raise ValueError("Unsupported format")
         return v
 
+    @validator("compression")
+    def validate_compression(cls, v):
+        if v is None:
+            return v
+        v = v.lower().strip()
+        if v not in {"none", "gzip", "zstd"}:
+            raise ValueError("Unsupported compression")
+        if v == "zstd" and engine.zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        return v
+
+    @validator("shard_mb")
+    def validate_shard_mb(cls, v):
+        if v is not None and v < 0:
+            raise ValueError("shard_mb must be >= 0")
+        return v
+
+class VerifyRequest(BaseModel):
+    chat_guid: Optional[str] = None # verify the chat's most recent export
+    path: Optional[str] = None # or a manifest / export folder relative to OUT_DIR
+    deep: bool = True # False only compares sizes
+
+class ExportJob(BaseModel):
+    chat_guid: str
+    format: str
+    compression: str
+    shard_mb: int
+    incremental: bool
+    status: str
+    error: Optional[str] = None
+    updated: Optional[str] = None
+    attachments_done: int
+    last_row_id: Optional[int] = None
+    parts_written: int
+
 # --- API Endpoints ---
 
 @app.get("/system/status")
 def get_status():
     return {"status": "ok", "version": "1.0.0", "storage": redact_path(OUT_DIR)}
 
+@app.get("/system/queries")
+def get_query_stats():
+    """Duration and row-count totals for every SQL statement run since startup."""
+    return query.query_stats()
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
@@ -87,6 +162,8 @@ def get_global_stats():
             "total_chats": stats.get("total_chats", 0),
             "top_contact_handle": stats.get("top_contact_handle", "N/A"),
             "top_contact_count": stats.get("top_contact_count", 0),
+            "top_contact_name": stats.get("top_contact_name", "N/A"),
+            "top_contact_person_id": stats.get("top_contact_person_id"),
             "storage_path": redact_path(OUT_DIR)
         }
     except Exception as e:
@@ -104,46 +181,93 @@ def get_recent_chats(search: Optional[str] = None, limit: int = 50):
             raise e
         raise HTTPException(status_code=500, detail=_safe_detail(e))
 
+@app.get("/contacts", response_model=List[Person])
+def get_people(limit: int = 50):
+    """People ranked by message count; a person's phone numbers and emails count together."""
+    try:
+        return db.get_people(limit=limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=_safe_detail(e))
+
+@app.get("/contacts/{person_id}/chats", response_model=List[Chat])
+def get_person_chats(person_id: str, limit: int = 50):
+    """Every conversation, 1:1 or group, that includes any handle of this person."""
+    try:
+        return db.get_recent_chats(limit=limit, person_id=person_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=_safe_detail(e))
+
 @app.get("/chats/{guid}/messages", response_model=List[Message])
 def get_chat_messages(guid: str, limit: int = 50):
     try:
-        # We need a new DB function for this to return raw structured data
-        # For now, we simulate or reuse existing logic
-        conn = db.get_db_connection()
-        cur = conn.cursor()
-        sql = """
-        SELECT m.ROWID as row_id, m.text, m.attributedBody, m.is_from_me, m.date, h.id as handle_id
-        FROM message m
-        JOIN chat_message_join cmj ON m.ROWID = cmj.message_id
-        JOIN chat c ON cmj.chat_id = c.ROWID
-        LEFT JOIN handle h ON m.handle_id = h.ROWID
-        WHERE c.guid = ?
-        ORDER BY m.date DESC LIMIT ?
-        """
-        rows = [dict(r) for r in cur.execute(sql, (guid, limit))]
-        conn.close()
-        
-        h_map = db.get_handle_map()
-        results = []
-        for r in reversed(rows):
-            # Decode body
-            text_decoded = decode_body(r['text'], r['attributedBody'])
-            
-            sender_name = "Me" if r['is_from_me'] else db.resolve_name(r['handle_id'], h_map)
-            
-            results.append({
-                "row_id": r['row_id'],
-                "text": text_decoded or "",
-                "is_from_me": bool(r['is_from_me']),
-                "date": mac_timestamp_to_iso(r['date']),
-                "handle_id": r['handle_id'],
-                "sender_name": sender_name
-            })
-            
-        return results
+        return db.get_chat_messages(guid, limit=limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=_safe_detail(e))
+
+@app.get("/chats/{guid}/attachments", response_model=AttachmentPage)
+def get_chat_attachments(guid: str, limit: int = 100, cursor: Optional[str] = None):
+    """Newest-first gallery page; pass the returned next_cursor to fetch the next one."""
+    before = None
+    if cursor:
+        try:
+            date_part, id_part = cursor.split(":", 1)
+            before = (int(date_part), int(id_part))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        items, next_cursor = db.get_chat_attachments(guid, limit=max(1, min(limit, 500)), before=before)
+        for item in items:
+            item["thumbnail_url"] = f"/attachments/{item['attachment_id']}/thumbnail"
+        return {"items": items, "next_cursor": f"{next_cursor[0]}:{next_cursor[1]}" if next_cursor else None}
     except Exception as e:
         raise HTTPException(status_code=500, detail=_safe_detail(e))
 
+@app.get("/attachments/{attachment_id}/thumbnail")
+def get_attachment_thumbnail(attachment_id: int, request: Request, size: int = 256):
+    if size not in thumbnails.THUMB_SIZES:
+        raise HTTPException(status_code=400, detail="Unsupported thumbnail size")
+    try:
+        att = db.get_attachment(attachment_id)
+        if not att:
+            raise HTTPException(status_code=404, detail="Attachment not found")
+        # Keys embed the source file's mtime/size, so a matching ETag is still fresh.
+        key = thumbnails.thumbnail_key(att, size)
+        headers = {"Cache-Control": "private, max-age=31536000, immutable"}
+        if key and request.headers.get("if-none-match") == f'"{key}"':
+            return Response(status_code=304, headers={**headers, "ETag": f'"{key}"'})
+        path, key = thumbnails.get_thumbnail(att, size)
+        if not path:
+            raise HTTPException(status_code=404, detail="No preview available")
+        return FileResponse(path, media_type="image/jpeg", headers={**headers, "ETag": f'"{key}"'})
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail=_safe_detail(e))
+
+@app.websocket("/ws/messages")
+async def messages_feed(websocket: WebSocket, chat_guid: Optional[str] = None):
+    """Push new messages (same shape as /chats/{guid}/messages plus chat_guid) as they land in chat.db."""
+    await websocket.accept()
+    queue = watcher.subscribe(chat_guid)
+
+    async def pump():
+        while True:
+            await websocket.send_json(await queue.get())
+
+    async def drain():
+        # Clients don't send anything; this just notices the disconnect.
+        while True:
+            await websocket.receive_text()
+
+    tasks = [asyncio.create_task(pump()), asyncio.create_task(drain())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for t in tasks: t.cancel()
+        # Collects the WebSocketDisconnect (or cancellation) so it isn't logged as unhandled.
+        await asyncio.gather(*tasks, return_exceptions=True)
+        watcher.unsubscribe(queue)
+
 @app.post("/onboarding/check-access", response_model=OnboardingCheckResponse)
 def check_access():
     success, msg = engine.check_db_access()
@@ -164,6 +288,15 @@ def complete_onboarding():
     db.save_metadata(metadata)
     return {"status": "ok"}
 
+def _safe_export_path(path):
+    if not path:
+        return None
+    try:
+        rel = os.path.relpath(path, OUT_DIR)
+        return rel if not rel.startswith("..") else os.path.basename(path)
+    except Exception:
+        return os.path.basename(path)
+
 @app.post("/chats/{guid}/archive")
 def archive_chat_endpoint(guid: str, req: ArchiveRequest):
     try:
@@ -171,17 +304,59 @@ def archive_chat_endpoint(guid: str, req: ArchiveRequest):
         # For now, we keep it simple as per original design, but maybe we can return a job ID later.
         if req.chat_guid and req.chat_guid != guid:
             raise HTTPException(status_code=400, detail="chat_guid mismatch")
-        path, count = engine.archive_chat(guid, req.format, req.incremental)
-        safe_path = None
-        if path:
-            try:
-                rel = os.path.relpath(path, OUT_DIR)
-                safe_path = rel if not rel.startswith("..") else os.path.basename(path)
-            except Exception:
-                safe_path = os.path.basename(path)
-        return {"status": "ok", "path": safe_path, "count": count}
+        path, count = engine.archive_chat(guid, req.format, req.incremental, compression=req.compression, shard_mb=req.shard_mb)
+        return {"status": "ok", "path": _safe_export_path(path), "count": count}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=_safe_detail(e))
+
+@app.get("/archive/jobs", response_model=List[ExportJob])
+def list_export_jobs():
+    """Interrupted exports that can be resumed from their last checkpoint."""
+    try:
+        return engine.list_export_checkpoints()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=_safe_detail(e))
+
+@app.post("/archive/jobs/{guid}/resume")
+def resume_export_job(guid: str):
+    try:
+        path, count = engine.resume_export(guid)
+        return {"status": "ok", "path": _safe_export_path(path), "count": count}
+    except KeyError:
+        raise HTTPException(status_code=404, detail="No interrupted export for this chat")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=_safe_detail(e))
+
+@app.delete("/archive/jobs/{guid}")
+def discard_export_job(guid: str):
+    if not engine.discard_export_checkpoint(guid):
+        raise HTTPException(status_code=404, detail="No interrupted export for this chat")
+    return {"status": "ok"}
+
+@app.post("/archive/verify")
+def verify_export_endpoint(req: VerifyRequest):
+    """Re-hash an export's files and attachments against its manifest."""
+    if req.chat_guid:
+        entry = db.load_metadata().get("chats", {}).get(req.chat_guid)
+        target = entry.get("manifest") if isinstance(entry, dict) else None
+        if not target:
+            raise HTTPException(status_code=404, detail="No export manifest recorded for this chat")
+    elif req.path:
+        root = os.path.realpath(OUT_DIR)
+        target = os.path.realpath(os.path.join(root, req.path))
+        if os.path.commonpath([root, target]) != root:
+            raise HTTPException(status_code=400, detail="Path must be inside the export folder")
+    else:
+        raise HTTPException(status_code=400, detail="chat_guid or path is required")
+    if not os.path.exists(target):
+        raise HTTPException(status_code=404, detail="Export not found")
+    try:
+        reports = verify.verify_export(target, deep=req.deep)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="No export manifest found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=_safe_detail(e))
+    return {"ok": all(r["ok"] for r in reports), "reports": reports}
 
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8000)
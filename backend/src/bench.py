@@ -0,0 +1,69 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+def _measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, current, peak
+
+def main(argv):
+    """Benchmark the read path and exports on a generated fixture.
+
+    Compares reading the archive query as dicts vs records, then times a full
+    ``archive_chat`` per format. Everything (fixture, exports, metadata, contact
+    index) lives in a temp directory.
+    """
+    from . import db, engine, identity, query
+    from .fixture import build_addressbook, build_fixture
+    from .records import record_factory
+
+    messages = next((int(a.split("=", 1)[1]) for a in argv if a.startswith("--messages=")), 200_000)
+    tmp = tempfile.mkdtemp(prefix="imessage_bench_")
+    path = os.path.join(tmp, "chat.db")
+    # config is already loaded by the package import; point the modules at the temp dir directly.
+    db.TMP_DB, db.METADATA_FILE = path, os.path.join(tmp, "metadata.json")
+    engine.OUT_DIR = os.path.join(tmp, "out")
+    identity.CONTACT_INDEX_DB = os.path.join(tmp, "contact_index.db")
+    identity.TMP_CONTACTS_DIR = tmp
+    build_addressbook(os.path.join(tmp, "fixture.abcddb"))
+    query.SLOW_QUERY_MS = float("inf")
+    build_fixture(path, messages)
+    chat_guid = "chat-1"
+    print(f"Fixture: {messages} messages at {path}")
+
+    def as_dicts():
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        rows = [dict(r) for r in conn.execute(engine.ARCHIVE_MESSAGES_SQL, (chat_guid, 0))]
+        conn.close()
+        return rows
+
+    def as_records():
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        conn.row_factory = record_factory
+        rows = conn.execute(engine.ARCHIVE_MESSAGES_SQL, (chat_guid, 0)).fetchall()
+        conn.close()
+        return rows
+
+    for label, fn in (("dict", as_dicts), ("record", as_records)):
+        fn() # warm the page cache
+        rows, elapsed, held, _ = _measure(fn)
+        print(f"rows {label:7} {len(rows)} rows  {elapsed * 1000:8.1f} ms  {held / 1e6:8.1f} MB held  {len(rows) / elapsed:10.0f} rows/s")
+        del rows
+
+    for fmt in ("json", "csv", "md"):
+        (_, count), elapsed, _, peak = _measure(lambda: engine.archive_chat(chat_guid, fmt, False, compression="none", shard_mb=0))
+        print(f"export {fmt:5} {count} messages  {elapsed:8.2f} s  {peak / 1e6:8.1f} MB peak")
+    return 0
+
+if __name__ == "__main__":
+    # python3 -m backend.src.bench [--messages=N]
+    sys.exit(main(sys.argv[1:]))
@@ -21,10 +21,27 @@ METADATA_FILE = os.path.expandvars(os.environ.get("METADATA_FILE", os.path.join(
 OCR_BIN = os.path.expandvars(os.environ.get("OCR_BIN", os.path.join(SCRIPT_DIR, "bin", "ocr_helper")))
 TRANSCRIBE_BIN = os.path.expandvars(os.environ.get("TRANSCRIBE_BIN", os.path.join(SCRIPT_DIR, "bin", "transcribe_helper")))
 
+# Export output: "none", "gzip" or "zstd" (zstd needs the optional `zstandard` package).
+EXPORT_COMPRESSION = os.environ.get("EXPORT_COMPRESSION", "none").lower().strip()
+# Roll exports over into part files once a part reaches this many MB (0 disables sharding).
+EXPORT_SHARD_MB = int(os.environ.get("EXPORT_SHARD_MB", "256") or 0)
+
 # T-006: Binary Hash Pinning (Security Hardening)
 OCR_HASH = "62e7dd0608edfb3a46dda9411dc9b24cfcdafe50a2d565613ed785f8fe7bb29b"
 TRANSCRIBE_HASH = "8ef2b3237023d5cefc35a0a1a2a60353cd54852d785241f76551de0f8ea56ced"
 
+# Statements slower than this are logged with their EXPLAIN QUERY PLAN.
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "200") or 200)
+# Test mode: registered hot queries raise instead of running when their plan has a full table scan.
+QUERY_PLAN_STRICT = os.environ.get("QUERY_PLAN_STRICT") == "1"
+
+# Gallery thumbnails: generated on demand, evicted oldest-first once the cache passes THUMB_CACHE_MB.
+THUMB_CACHE_DIR = os.path.expandvars(os.environ.get("THUMB_CACHE_DIR", os.path.expanduser("~/Library/Caches/IMSGArchiver/thumbnails")))
+THUMB_CACHE_MB = int(os.environ.get("THUMB_CACHE_MB", "512") or 0)
+
+# Contact identity index (person -> handles), attached to the working DB as the `identity` schema.
+CONTACT_INDEX_DB = os.path.expandvars(os.environ.get("CONTACT_INDEX_DB", os.path.expanduser("~/Library/Caches/IMSGArchiver/contact_index.db")))
+
 REACTION_MAP = {
     2000: "Loved", 2001: "Liked", 2002: "Disliked", 2003: "Laughed",
     2004: "Emphasized", 2005: "Questioned", 3000: "Removed Love",
@@ -4,8 +4,11 @@ import json
 import shutil
 import tempfile
 import atexit
-from .config import DEFAULT_DB_PATH, TMP_DB, METADATA_FILE, TMP_CONTACTS_DIR
+from .config import DEFAULT_DB_PATH, TMP_DB, METADATA_FILE, REACTION_MAP
 from .helpers import mac_timestamp_to_iso, normalize_handle, redact_path
+from .query import run_query, run_query_one, register_hot_query
+from .records import record_factory
+from .identity import attach_identity_index, get_address_names, SCHEMA as IDENTITY
 
 _TEMP_DB_DIR = None
 
@@ -46,6 +49,7 @@ def _normalize_metadata(data):
     data.setdefault("chats", {})
     data.setdefault("cache", {})
     data.setdefault("ui_defaults", {})
+    data.setdefault("checkpoints", {})
     return data
 
 def load_metadata():
@@ -66,23 +70,8 @@ def save_metadata(data):
     except IOError: pass
 
 def get_handle_map():
-    h_map = {}
-    if TMP_CONTACTS_DIR and os.path.exists(TMP_CONTACTS_DIR):
-        for db_file in os.listdir(TMP_CONTACTS_DIR):
-            if not db_file.endswith(".abcddb"): continue
-            db_path = os.path.join(TMP_CONTACTS_DIR, db_file)
-            try:
-                conn = sqlite3.connect(db_path)
-                cur = conn.cursor()
-                for r in cur.execute("SELECT r.ZFIRSTNAME, r.ZLASTNAME, r.ZORGANIZATION, p.ZFULLNUMBER FROM ZABCDPHONENUMBER p JOIN ZABCDRECORD r ON p.ZOWNER = r.Z_PK"):
-                    name = " ".join(filter(None, [r[0], r[1]])) or r[2]
-                    if name and r[3]: h_map[normalize_handle(r[3])] = name
-                for r in cur.execute("SELECT r.ZFIRSTNAME, r.ZLASTNAME, r.ZORGANIZATION, e.ZADDRESS FROM ZABCDEMAILADDRESS e JOIN ZABCDRECORD r ON e.ZOWNER = r.Z_PK"):
-                    c_name = " ".join(filter(None, [r[0], r[1]])) or r[2]
-                    if c_name and r[3]: h_map[normalize_handle(r[3])] = c_name
-                conn.close()
-            except sqlite3.Error: continue
-    return h_map
+    """``{normalized address: contact name}``; every address of a merged person maps to the same name."""
+    return get_address_names()
 
 def resolve_name(handle, h_map=None):
     if not handle: return "Unknown"
@@ -105,22 +94,27 @@ def get_db_connection():
         raise RuntimeError(f"Database not found at {redact_path(target_db)}")
          
     conn = sqlite3.connect(target_db)
-    conn.row_factory = sqlite3.Row
+    conn.row_factory = record_factory
+    attach_identity_index(conn, os.path.abspath(target_db))
     return conn
 
-def get_recent_chats(limit=100, groups_only=False, one_on_one_only=False, search_filter=None, h_map=None):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    filter_sql = ""
-    params = []
-    if groups_only: filter_sql += " AND c.style = 43"
-    if one_on_one_only: filter_sql += " AND c.style = 45"
-    if search_filter:
-        filter_sql += " AND (h_filter.id LIKE ? OR c.display_name LIKE ?)"
-        params.extend([f"%{search_filter}%", f"%{search_filter}%"])
-    
-    sql = f"""
+# Participants are read driving from chat_handle_join so the (chat_id, handle_id) index is used.
+# Handles belonging to one person (phone + email, SMS + iMessage) collapse into a single name;
+# unknown handles show their raw id.
+PARTICIPANT_NAMES_SUBQUERY = f"""(SELECT GROUP_CONCAT(name, ', ') FROM (
+        SELECT COALESCE(p.name, MIN(h2.id)) as name
+        FROM chat_handle_join chj CROSS JOIN handle h2 ON h2.ROWID = chj.handle_id
+        LEFT JOIN {IDENTITY}.person_handle ph ON ph.handle_rowid = chj.handle_id
+        LEFT JOIN {IDENTITY}.person p ON p.person_id = ph.person_id
+        WHERE chj.chat_id = c.ROWID
+        GROUP BY COALESCE(ph.person_id, h2.ROWID)
+        ORDER BY MIN(chj.handle_id)))"""
+
+# Chats that include any handle of one person.
+PERSON_CHATS_FILTER = f"""c.ROWID IN (SELECT chj_p.chat_id FROM {IDENTITY}.person_handle ph_p
+        CROSS JOIN chat_handle_join chj_p ON chj_p.handle_id = ph_p.handle_rowid WHERE ph_p.person_id = ?)"""
+
+RECENT_CHATS_SQL = """
     SELECT 
         c.guid as chat_guid,
         MAX(m.date) as last_date,
@@ -129,71 +123,216 @@ def get_recent_chats(limit=100, groups_only=False, one_on_one_only=False, search
         MAX(CASE WHEN a.mime_type LIKE 'video/%' THEN 1 ELSE 0 END) as has_vid,
         MAX(CASE WHEN a.mime_type LIKE 'audio/%' OR m.is_audio_message = 1 THEN 1 ELSE 0 END) as has_aud,
         c.display_name,
-        (SELECT GROUP_CONCAT(h2.id) FROM handle h2 JOIN chat_handle_join chj ON h2.ROWID = chj.handle_id WHERE chj.chat_id = c.ROWID) as participant_handles
+        {participants} as participant_names
     FROM chat c
     JOIN chat_message_join cmj ON c.ROWID = cmj.chat_id
     JOIN message m ON cmj.message_id = m.ROWID
     LEFT JOIN chat_handle_join chj_filter ON c.ROWID = chj_filter.chat_id
     LEFT JOIN handle h_filter ON chj_filter.handle_id = h_filter.ROWID
+    LEFT JOIN {identity}.person_handle ph_filter ON ph_filter.handle_rowid = chj_filter.handle_id
+    LEFT JOIN {identity}.person p_filter ON p_filter.person_id = ph_filter.person_id
     LEFT JOIN message_attachment_join maj ON m.ROWID = maj.message_id
     LEFT JOIN attachment a ON maj.attachment_id = a.ROWID
-    WHERE 1=1 {{filter_sql}}
+    WHERE 1=1 {filter_sql}
     GROUP BY c.guid
     ORDER BY last_date DESC
     LIMIT ?
     """
+register_hot_query("db.recent_chats", RECENT_CHATS_SQL.format(participants=PARTICIPANT_NAMES_SUBQUERY, identity=IDENTITY, filter_sql=""),
+                   (100,), allow_scan=("c",))
+register_hot_query("db.person_chats", RECENT_CHATS_SQL.format(participants=PARTICIPANT_NAMES_SUBQUERY, identity=IDENTITY, filter_sql=f" AND {PERSON_CHATS_FILTER}"),
+                   ("person-id", 100))
+
+def get_recent_chats(limit=100, groups_only=False, one_on_one_only=False, search_filter=None, person_id=None):
+    conn = get_db_connection()
+    
+    filter_sql = ""
+    params = []
+    if groups_only: filter_sql += " AND c.style = 43"
+    if one_on_one_only: filter_sql += " AND c.style = 45"
+    if search_filter:
+        filter_sql += " AND (h_filter.id LIKE ? OR c.display_name LIKE ? OR p_filter.name LIKE ?)"
+        params.extend([f"%{search_filter}%"] * 3)
+    if person_id:
+        filter_sql += f" AND {PERSON_CHATS_FILTER}"
+        params.append(person_id)
+    
     params.append(limit)
-    rows = [dict(r) for r in cur.execute(sql.format(filter_sql=filter_sql), params)]
+    sql = RECENT_CHATS_SQL.format(participants=PARTICIPANT_NAMES_SUBQUERY, identity=IDENTITY, filter_sql=filter_sql)
+    name = "db.recent_chats.filtered" if filter_sql else "db.recent_chats"
+    if person_id and not (groups_only or one_on_one_only or search_filter): name = "db.person_chats"
+    rows = run_query(conn, sql, params, name=name)
     conn.close()
 
-    if h_map is None: h_map = get_handle_map()
-
     results = []
     for r in rows:
-        handles = (r["participant_handles"] or "").split(",")
-        names = [resolve_name(h, h_map) for h in handles if h]
-        p_names = ", ".join(names)
-        display_names = r["display_name"] or p_names or "Unknown Chat"
-        if r["display_name"] and p_names and r["display_name"] != p_names:
-            display_names = f"[{r['display_name']}] {p_names}"
+        p_names = r.participant_names or ""
+        display_names = r.display_name or p_names or "Unknown Chat"
+        if r.display_name and p_names and r.display_name != p_names:
+            display_names = f"[{r.display_name}] {p_names}"
         
         badges = ""
-        if r["has_img"]: badges += "📸"
-        if r["has_vid"]: badges += "🎥"
-        if r["has_aud"]: badges += "🎙️"
+        if r.has_img: badges += "📸"
+        if r.has_vid: badges += "🎥"
+        if r.has_aud: badges += "🎙️"
         
         results.append({
-            "chat_guid": r["chat_guid"],
-            "last_date": r["last_date"],
-            "msg_count": r["msg_count"],
+            "chat_guid": r.chat_guid,
+            "last_date": r.last_date,
+            "msg_count": r.msg_count,
             "badges": badges,
             "display_names": display_names
         })
     return results
 
-def get_message_preview(chat_guid, count=5, h_map=None):
-    from .helpers import decode_body
-    if h_map is None: h_map = get_handle_map()
+# Counts per integer handle come off the message(handle_id, date) index, then fold per person.
+PEOPLE_SQL = register_hot_query("db.people", f"""
+    SELECT ph.person_id, p.name, MIN(h.id) as address, GROUP_CONCAT(DISTINCT h.id) as handles,
+           SUM(t.cnt) as msg_count, MAX(t.last_date) as last_date
+    FROM (SELECT handle_id, COUNT(*) as cnt, MAX(date) as last_date FROM message WHERE handle_id > 0 GROUP BY handle_id) t
+    JOIN {IDENTITY}.person_handle ph ON ph.handle_rowid = t.handle_id
+    JOIN handle h ON h.ROWID = t.handle_id
+    LEFT JOIN {IDENTITY}.person p ON p.person_id = ph.person_id
+    GROUP BY ph.person_id
+    ORDER BY msg_count DESC
+    LIMIT ?
+    """, (50,))
+
+def get_people(limit=50):
+    """People ranked by message count, each merging all of their handles."""
     conn = get_db_connection()
-    cur = conn.cursor()
-    sql = """
-    SELECT m.text, m.attributedBody, m.is_from_me, m.date, h.id as handle_id
+    rows = run_query(conn, PEOPLE_SQL, (limit,), name="db.people")
+    conn.close()
+    return [{
+        "person_id": r.person_id,
+        "name": r.name or r.address,
+        "handles": r.handles.split(","),
+        "msg_count": r.msg_count,
+        "last_date": mac_timestamp_to_iso(r.last_date),
+    } for r in rows]
+
+CHAT_MESSAGES_SQL = register_hot_query("db.chat_messages", f"""
+    SELECT m.ROWID as row_id, m.guid, m.text, m.attributedBody, m.is_from_me, m.date, h.id as handle_id,
+           m.associated_message_type, m.associated_message_guid, m.thread_originator_guid,
+           COALESCE(p.name, h.id, 'Unknown') as sender_name
     FROM message m
     JOIN chat_message_join cmj ON m.ROWID = cmj.message_id
     JOIN chat c ON cmj.chat_id = c.ROWID
     LEFT JOIN handle h ON m.handle_id = h.ROWID
+    LEFT JOIN {IDENTITY}.person_handle ph ON ph.handle_rowid = m.handle_id
+    LEFT JOIN {IDENTITY}.person p ON p.person_id = ph.person_id
     WHERE c.guid = ?
     ORDER BY m.date DESC
-    LIMIT ?;
-    """
-    rows = [dict(r) for r in cur.execute(sql, (chat_guid, count))]
+    LIMIT ?
+    """, ("chat-guid", 50))
+
+def get_message_preview(chat_guid, count=5):
+    from .helpers import decode_body
+    conn = get_db_connection()
+    rows = run_query(conn, CHAT_MESSAGES_SQL, (chat_guid, count), name="db.chat_messages")
     conn.close()
     
     preview_lines = []
     for r in reversed(rows):
-        ts = mac_timestamp_to_iso(r["date"])
-        sender = "Me" if r["is_from_me"] else resolve_name(r["handle_id"], h_map)
-        body = decode_body(r["text"], r["attributedBody"]) or "[Media]"
+        ts = mac_timestamp_to_iso(r.date)
+        sender = "Me" if r.is_from_me else r.sender_name
+        body = decode_body(r.text, r.attributedBody) or "[Media]"
         if len(body) > 60: body = body[:57] + "..."
         preview_lines.append(f"[{ts}] {sender}: {body}")
     return "\n".join(preview_lines)
+
+def get_chat_messages(chat_guid, limit=50):
+    """Latest ``limit`` messages of a chat, oldest first, shaped for the messages endpoint.
+
+    Tapbacks inside the page are folded onto their targets' ``reactions``; a page is
+    always the newest messages, so any standing tapback on a paged message is in it.
+    """
+    from .helpers import decode_body, AssociationIndex, parse_associated_guid
+    conn = get_db_connection()
+    rows = run_query(conn, CHAT_MESSAGES_SQL, (chat_guid, limit), name="db.chat_messages")
+    conn.close()
+
+    rows.reverse()
+    sender_names = ["Me" if r.is_from_me else r.sender_name for r in rows]
+    associations = AssociationIndex()
+    for r, sender_name in zip(rows, sender_names):
+        associations.add(r.associated_message_type, r.associated_message_guid, r.thread_originator_guid, sender_name)
+
+    results = []
+    for r, sender_name in zip(rows, sender_names):
+        reaction = REACTION_MAP.get(r.associated_message_type or 0, "")
+        results.append({
+            "row_id": r.row_id,
+            "guid": r.guid,
+            "text": decode_body(r.text, r.attributedBody) or "",
+            "is_from_me": bool(r.is_from_me),
+            "date": mac_timestamp_to_iso(r.date),
+            "handle_id": r.handle_id,
+            "sender_name": sender_name,
+            "reaction_type": reaction,
+            "reaction_target": parse_associated_guid(r.associated_message_guid) if reaction else "",
+            "reactions": associations.reactions(r.guid),
+            "thread_id": associations.thread_id(r.guid, r.thread_originator_guid),
+        })
+    return results
+
+# Walks chat_message_join's (chat_id, message_date) index newest first and stops at LIMIT;
+# message is only looked up for the rows returned.
+CHAT_ATTACHMENTS_SQL = """
+    SELECT a.ROWID as attachment_id, a.guid, a.mime_type, a.transfer_name, a.total_bytes,
+           cmj.message_id as message_row_id, cmj.message_date as date,
+           (SELECT m.is_from_me FROM message m WHERE m.ROWID = cmj.message_id) as is_from_me
+    FROM chat c
+    JOIN chat_message_join cmj ON c.ROWID = cmj.chat_id
+    JOIN message_attachment_join maj ON cmj.message_id = maj.message_id
+    JOIN attachment a ON maj.attachment_id = a.ROWID
+    WHERE c.guid = ? {cursor_sql}
+    ORDER BY cmj.message_date DESC, a.ROWID DESC
+    LIMIT ?
+    """
+# The date bound alone is the index range; the OR only breaks ties within one date.
+ATTACHMENTS_CURSOR_SQL = "AND cmj.message_date <= ? AND (cmj.message_date < ? OR a.ROWID < ?)"
+register_hot_query("db.chat_attachments", CHAT_ATTACHMENTS_SQL.format(cursor_sql=""), ("chat-guid", 101))
+register_hot_query("db.chat_attachments_page", CHAT_ATTACHMENTS_SQL.format(cursor_sql=ATTACHMENTS_CURSOR_SQL), ("chat-guid", 0, 0, 0, 101))
+
+def get_chat_attachments(chat_guid, limit=100, before=None):
+    """Page a chat's attachments newest first, keyed by (message date, attachment ROWID).
+
+    ``before`` is the ``(date, attachment_id)`` cursor returned for the previous page.
+    Returns ``(items, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    conn = get_db_connection()
+    if before:
+        name, cursor_sql, params = "db.chat_attachments_page", ATTACHMENTS_CURSOR_SQL, [chat_guid, before[0], before[0], before[1]]
+    else:
+        name, cursor_sql, params = "db.chat_attachments", "", [chat_guid]
+    params.append(limit + 1)
+    rows = run_query(conn, CHAT_ATTACHMENTS_SQL.format(cursor_sql=cursor_sql), params, name=name)
+    conn.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1].date, rows[-1].attachment_id)
+    items = []
+    for r in rows:
+        items.append({
+            "attachment_id": r.attachment_id,
+            "guid": r.guid,
+            "message_row_id": r.message_row_id,
+            "date": mac_timestamp_to_iso(r.date),
+            "mime_type": r.mime_type,
+            "transfer_name": r.transfer_name,
+            "total_bytes": r.total_bytes or 0,
+            "is_from_me": bool(r.is_from_me),
+        })
+    return items, next_cursor
+
+def get_attachment(attachment_id):
+    conn = get_db_connection()
+    row = run_query_one(conn, "SELECT ROWID as attachment_id, guid, filename, mime_type FROM attachment WHERE ROWID = ?", (attachment_id,), name="db.attachment")
+    conn.close()
+    if not row: return None
+    att = row._asdict()
+    if att["filename"]: att["filename"] = att["filename"].replace("~", os.path.expanduser("~"))
+    return att
@@ -1,19 +1,44 @@
 import os
-import shutil
 import concurrent.futures
 import subprocess
 import datetime
 import csv
 import json
-from .config import OUT_DIR, OCR_BIN, TRANSCRIBE_BIN, REACTION_MAP, OCR_HASH, TRANSCRIBE_HASH
-from .helpers import get_file_hash, mac_timestamp_to_iso, decode_body, redact_path
-from .db import load_metadata, save_metadata, get_handle_map, resolve_name, get_db_connection
+import gzip
+import time
+import threading
+import operator
+from collections import namedtuple
+from .config import OUT_DIR, OCR_BIN, TRANSCRIBE_BIN, REACTION_MAP, OCR_HASH, TRANSCRIBE_HASH, EXPORT_COMPRESSION, EXPORT_SHARD_MB
+from .helpers import get_file_hash, mac_timestamp_to_iso, decode_body, redact_path, AssociationIndex, parse_associated_guid, format_reactions, copy_with_sha256, HASH_CHUNK
+from .db import load_metadata, save_metadata, get_handle_map, resolve_name, get_db_connection, PARTICIPANT_NAMES_SUBQUERY, IDENTITY
+from .query import run_query, run_query_one, register_hot_query
 import cProfile
 import pstats
 import io
 import hashlib
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 ALLOWED_FORMATS = {"csv", "json", "md"}
+ALLOWED_COMPRESSION = {"none", "gzip", "zstd"}
+COMPRESSION_SUFFIX = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+ZSTD_DECODE_HINT = "multi-frame: zstd CLI, or zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)"
+CHECKPOINT_INTERVAL = 5.0 # seconds between durable export checkpoints
+_ACTIVE_EXPORTS = set()
+_ACTIVE_LOCK = threading.Lock()
+_METADATA_LOCK = threading.Lock()
+CSV_FIELDS = ["timestamp", "sender", "text", "attachments", "guid", "service", "reaction_type", "sender_handle", "is_from_me",
+              "reaction_target", "reactions", "thread_id"]
+# One exported message; field order is the JSON key order.
+ExportRecord = namedtuple("ExportRecord", ["timestamp", "sender", "sender_handle", "text", "attachments", "guid", "service",
+                                           "is_from_me", "reaction_type", "reaction_target", "reactions", "thread_id"])
+_CSV_COLUMNS = operator.itemgetter(*[ExportRecord._fields.index(f) for f in CSV_FIELDS])
+_REACTIONS_COL = CSV_FIELDS.index("reactions")
+_JSON_KEYS = [json.dumps(f) for f in ExportRecord._fields]
 
 def verify_binary(path, expected_hash):
     if not path or not os.path.exists(path): return False
@@ -42,10 +67,16 @@ def check_db_access(db_path=None):
         return False, f"Error accessing database: {str(e)}"
 
 def process_attachment_task(row_id, raw_path, mime, ts_iso, contact_dir, metadata):
+    """Copy one attachment into the export and run OCR/transcription on it.
+
+    Returns ``(row_id, rel_path, extra_text, info)``; ``info`` is the manifest entry
+    (source, path, size, sha256, status of "copied", "missing" or "copy_failed").
+    """
     metadata = metadata or {}
     metadata.setdefault("cache", {})
+    info = {"row_id": row_id, "source": raw_path, "path": "", "size": None, "sha256": None, "status": "missing"}
     if not os.path.exists(raw_path): 
-        return row_id, "", f" [Missing Attachment: {os.path.basename(raw_path)}]"
+        return row_id, "", f" [Missing Attachment: {os.path.basename(raw_path)}]", info
     
     file_hash = get_file_hash(raw_path)
     cached_data = metadata["cache"].get(file_hash) if file_hash else None
@@ -95,10 +126,13 @@ def process_attachment_task(row_id, raw_path, mime, ts_iso, contact_dir, metadat
         if file_hash and extra_text: metadata["cache"][file_hash] = extra_text
     
     try:
-        shutil.copy2(raw_path, dest)
+        info["size"], info["sha256"] = copy_with_sha256(raw_path, dest)
         rel_path = os.path.join("Media", subfolder, new_name)
-        return row_id, rel_path, extra_text
-    except: return row_id, "", extra_text
+        info.update(path=rel_path, status="copied")
+        return row_id, rel_path, extra_text, info
+    except:
+        info["status"] = "copy_failed"
+        return row_id, "", extra_text, info
 
 def _unique_output_path(out_dir, base_name, ext, force_timestamp=False):
     ext = ext.lstrip(".")
@@ -116,36 +150,316 @@ def _unique_output_path(out_dir, base_name, ext, force_timestamp=False):
         i += 1
     return candidate
 
-def archive_chat(chat_guid, format_ext, is_incremental, metadata=None, h_map=None, progress_callback=None):
+def _normalize_compression(compression):
+    compression = (compression or "none").lower().strip()
+    if compression not in ALLOWED_COMPRESSION:
+        raise ValueError("Unsupported export compression")
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd compression requires the 'zstandard' package")
+    return compression
+
+class _HashingWriter:
+    """File-like passthrough that hashes the bytes landing on disk."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.sha256.update(data)
+        return self.raw.write(data)
+
+    def flush(self):
+        self.raw.flush()
+
+class _ExportPart:
+    """Byte sink for one export part, compressing on the fly.
+
+    ``commit()`` ends the current gzip member / zstd frame and returns the raw file
+    offset, which is always a valid place to truncate and append from on resume
+    (gzip readers and the zstd CLI decode concatenated members/frames as one
+    stream; python-zstandard needs ``read_across_frames=True``). The on-disk
+    bytes are hashed as they are written for the export manifest.
+    """
+
+    def __init__(self, path, compression, offset=None):
+        self.compression = compression
+        if offset is None:
+            self.raw = open(path, "wb")
+            self.out = _HashingWriter(self.raw)
+        else:
+            self.raw = open(path, "r+b")
+            self.raw.truncate(offset)
+            self.out = _HashingWriter(self.raw)
+            # Re-hash the committed prefix we are appending to.
+            while self.raw.tell() < offset:
+                chunk = self.raw.read(min(HASH_CHUNK, offset - self.raw.tell()))
+                if not chunk: break
+                self.out.sha256.update(chunk)
+            self.raw.seek(offset)
+        self._start_frame()
+
+    def _start_frame(self):
+        if self.compression == "gzip":
+            self.sink = gzip.GzipFile(fileobj=self.out, mode="wb", compresslevel=6)
+        elif self.compression == "zstd":
+            self.sink = zstandard.ZstdCompressor(level=3).stream_writer(self.out, closefd=False)
+        else:
+            self.sink = self.out
+
+    def _end_frame(self):
+        if self.sink is not self.out:
+            self.sink.close()
+        self.raw.flush()
+
+    def write(self, data):
+        self.sink.write(data)
+
+    def commit(self):
+        self._end_frame()
+        os.fsync(self.raw.fileno())
+        offset = self.raw.tell()
+        self._start_frame()
+        return offset
+
+    def close(self):
+        """Finish the part; returns (size on disk, sha256 hex)."""
+        self._end_frame()
+        size = self.raw.tell()
+        self.raw.close()
+        return size, self.out.sha256.hexdigest()
+
+def _format_header(format_ext, folder_name, part_no):
+    if format_ext == "csv":
+        buf = io.StringIO()
+        csv.writer(buf).writerow(CSV_FIELDS)
+        return buf.getvalue()
+    if format_ext == "json":
+        return "[\n"
+    title = f"# Chat: {folder_name}" + (f" (part {part_no})" if part_no > 1 else "")
+    return f"{title}\n\n"
+
+def _format_record(format_ext, entry, first):
+    if format_ext == "csv":
+        buf = io.StringIO()
+        row = list(_CSV_COLUMNS(entry))
+        row[_REACTIONS_COL] = format_reactions(entry.reactions)
+        csv.writer(buf).writerow(row)
+        return buf.getvalue()
+    if format_ext == "json":
+        # Same bytes as json.dump(list, indent=2) per element, but each value goes through
+        # the C encoder (indent= forces the pure-Python one) and no dict is built.
+        fields = []
+        for key, value in zip(_JSON_KEYS, entry):
+            encoded = json.dumps(value, indent=2).replace("\n", "\n    ") if isinstance(value, dict) and value else json.dumps(value)
+            fields.append(f"    {key}: {encoded}")
+        body = "  {\n" + ",\n".join(fields) + "\n  }"
+        return body if first else ",\n" + body
+    reply = "↳ " if entry.thread_id and entry.thread_id != entry.guid else ""
+    reactions = f" _({format_reactions(entry.reactions)})_" if entry.reactions else ""
+    return f"{reply}**[{entry.timestamp}] {entry.sender}:** {entry.text}{reactions}\n\n"
+
+def _format_footer(format_ext):
+    return "\n]" if format_ext == "json" else ""
+
+def write_export(records, out_dir, format_ext, folder_name, compression="none", shard_mb=0, force_timestamp=False,
+                 state=None, on_checkpoint=None, manifest_extra=None):
+    """Stream (row_id, message_date, entry) records to disk.
+
+    Output goes to a single ``chat_export.<ext>[.gz|.zst]`` file. When ``shard_mb`` is
+    set and the uncompressed output outgrows it, the export rolls over into
+    ``chat_export.partNNNN.<ext>`` files plus a ``chat_export.manifest.json`` listing
+    the ROWID/date range of every part. Returns the export file (or manifest) path.
+
+    ``state`` holds the output layout and committed offset; pass a checkpointed
+    state back in (with ``records`` starting after its last row) to resume.
+    ``on_checkpoint(state)`` is called after each durable commit.
+
+    Every export also gets a ``<base>.manifest.json`` with each file's size and
+    sha256 plus anything in ``manifest_extra`` (e.g. the attachment inventory).
+    """
+    compression = _normalize_compression(compression)
+    suffix = COMPRESSION_SUFFIX[compression]
+    shard_limit = max(0, int(shard_mb or 0)) * 1024 * 1024
+    ext = f"{format_ext}{suffix}"
+    if state is None: state = {}
+
+    def part_path(n):
+        return f"{state['base']}.part{n:04d}.{ext}"
+
+    if not state.get("base"):
+        single_path = _unique_output_path(out_dir, "chat_export", ext, force_timestamp=force_timestamp)
+        state.update(single_path=single_path, base=single_path[:-len(f".{ext}")], shards=[], offset=0)
+        if os.path.exists(f"{state['base']}.manifest.json") or os.path.exists(part_path(1)):
+            # A previous sharded export owns this name; fall back to a timestamped one.
+            single_path = _unique_output_path(out_dir, "chat_export", ext, force_timestamp=True)
+            state.update(single_path=single_path, base=single_path[:-len(f".{ext}")])
+    single_path = state["single_path"]
+    shards = state["shards"]
+
+    def start_part():
+        part = _ExportPart(shards[-1]["file"], compression)
+        data = _format_header(format_ext, folder_name, len(shards)).encode("utf-8")
+        part.write(data)
+        shards[-1]["bytes"] = len(data)
+        return part
+
+    def checkpoint():
+        state["offset"] = stream.commit()
+        if last is not None: state["last_row_id"], state["last_date"] = last
+        shards[-1]["committed"] = {k: v for k, v in shards[-1].items() if k != "committed"}
+        on_checkpoint(state)
+
+    stream = None
+    last = (state["last_row_id"], state["last_date"]) if "last_row_id" in state else None
+    if shards:
+        if len(shards) == 1 and not os.path.exists(single_path) and os.path.exists(part_path(1)):
+            shards[0]["file"] = part_path(1) # interrupted between the first rollover and its checkpoint
+        if "committed" in shards[-1]:
+            stream = _ExportPart(shards[-1]["file"], compression, offset=state["offset"])
+            # Bytes past the committed offset were discarded; restore the committed tallies.
+            shards[-1].update(shards[-1]["committed"])
+        else:
+            # Interrupted before this part's first commit: nothing in it is durable, start it over.
+            for key in ("first_row_id", "first_date", "last_row_id", "last_date"): shards[-1].pop(key, None)
+            shards[-1].update(count=0, bytes=0)
+            stream = start_part()
+            if on_checkpoint: checkpoint()
+    last_commit = time.monotonic()
+    try:
+        for row_id, message_date, entry in records:
+            if stream is None or (shard_limit and shards[-1]["bytes"] >= shard_limit):
+                if stream is not None:
+                    stream.write(_format_footer(format_ext).encode("utf-8"))
+                    shards[-1]["size"], shards[-1]["sha256"] = stream.close()
+                    if len(shards) == 1:
+                        # First rollover: the initial part becomes part0001.
+                        os.replace(single_path, part_path(1))
+                        shards[0]["file"] = part_path(1)
+                n = len(shards) + 1
+                shards.append({"file": single_path if n == 1 else part_path(n), "count": 0, "bytes": 0})
+                stream = start_part()
+                # Commit the header so a resume never truncates into it or points at a closed part.
+                if on_checkpoint: checkpoint()
+            current = shards[-1]
+            data = _format_record(format_ext, entry, current["count"] == 0).encode("utf-8")
+            stream.write(data)
+            current["bytes"] += len(data)
+            if current["count"] == 0:
+                current["first_row_id"], current["first_date"] = row_id, message_date
+            current["last_row_id"], current["last_date"] = row_id, message_date
+            current["count"] += 1
+            last = (row_id, message_date)
+            if on_checkpoint and time.monotonic() - last_commit >= CHECKPOINT_INTERVAL:
+                checkpoint()
+                last_commit = time.monotonic()
+    except BaseException:
+        # Leave the open part as-is; a resume truncates it back to the committed offset.
+        if stream is not None: stream.raw.close()
+        raise
+    if stream is not None:
+        stream.write(_format_footer(format_ext).encode("utf-8"))
+        shards[-1]["size"], shards[-1]["sha256"] = stream.close()
+    for sh in shards: sh.pop("committed", None)
+
+    manifest = {
+        "version": 1,
+        "created": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "format": format_ext,
+        "compression": compression,
+        "shard_mb": shard_mb,
+        # Each checkpoint ends a gzip member / zstd frame, so compressed parts are concatenations.
+        "multi_frame": compression != "none",
+        "total_count": sum(sh["count"] for sh in shards),
+        "shards": [],
+    }
+    if compression == "zstd":
+        # python-zstandard's decompress() and a default stream_reader stop silently after the first frame.
+        manifest["decode"] = ZSTD_DECODE_HINT
+    for sh in shards:
+        manifest["shards"].append({
+            "file": os.path.basename(sh["file"]),
+            "count": sh["count"],
+            "size": sh["size"],
+            "sha256": sh["sha256"],
+            "uncompressed_bytes": sh["bytes"],
+            "first_row_id": sh["first_row_id"],
+            "last_row_id": sh["last_row_id"],
+            "first_date": sh["first_date"],
+            "last_date": sh["last_date"],
+            "first_iso": mac_timestamp_to_iso(sh["first_date"]),
+            "last_iso": mac_timestamp_to_iso(sh["last_date"]),
+        })
+    if manifest_extra: manifest.update(manifest_extra)
+    manifest_path = f"{state['base']}.manifest.json"
+    with open(manifest_path, "w", encoding="utf-8") as f: json.dump(manifest, f, indent=2)
+    return single_path if len(shards) == 1 else manifest_path
+
+CHAT_INFO_SQL = register_hot_query("engine.chat_info", f"""
+    SELECT c.display_name,
+    {PARTICIPANT_NAMES_SUBQUERY} as participant_names
+    FROM chat c WHERE c.guid = ?
+    """, ("chat-guid",))
+
+ARCHIVE_MESSAGES_SQL = register_hot_query("engine.archive_messages", """
+    SELECT m.ROWID as row_id, m.date as message_date, m.date_read, m.date_delivered, m.is_from_me,
+           m.text, m.attributedBody, m.service, m.associated_message_type, m.associated_message_guid,
+           m.thread_originator_guid, m.guid,
+           h.id as handle_id, a.filename as att_path, a.mime_type as att_mime, m.is_audio_message
+    FROM message m
+    JOIN chat_message_join cmj ON m.ROWID = cmj.message_id
+    JOIN chat c ON cmj.chat_id = c.ROWID
+    LEFT JOIN handle h ON m.handle_id = h.ROWID
+    LEFT JOIN message_attachment_join maj ON m.ROWID = maj.message_id
+    LEFT JOIN attachment a ON maj.attachment_id = a.ROWID
+    WHERE c.guid = ? AND m.date >= ? ORDER BY m.date ASC
+    """, ("chat-guid", 0))
+
+# Count per integer handle first, then fold every handle of a person (phone, email, SMS vs iMessage).
+# The inner count walks message_idx_handle over handle_id > 0 already grouped by handle; it still
+# reads each of those message rows for is_from_me, so it grows with the table but never scans it.
+TOP_CONTACT_SQL = register_hot_query("engine.top_contact", f"""
+    SELECT MIN(h.id) as handle, SUM(t.cnt) as cnt, ph.person_id, p.name
+    FROM (SELECT handle_id, COUNT(*) as cnt FROM message WHERE is_from_me = 0 AND handle_id > 0 GROUP BY handle_id) t
+    JOIN {IDENTITY}.person_handle ph ON ph.handle_rowid = t.handle_id
+    JOIN handle h ON t.handle_id = h.ROWID
+    LEFT JOIN {IDENTITY}.person p ON p.person_id = ph.person_id
+    GROUP BY ph.person_id
+    ORDER BY cnt DESC
+    LIMIT 1
+    """)
+
+def archive_chat(chat_guid, format_ext, is_incremental, metadata=None, h_map=None, progress_callback=None, compression=None, shard_mb=None):
     format_ext = (format_ext or "").lower().strip().lstrip(".")
     if format_ext not in ALLOWED_FORMATS:
         raise ValueError("Unsupported export format")
+    compression = _normalize_compression(EXPORT_COMPRESSION if compression is None else compression)
+    if shard_mb is None: shard_mb = EXPORT_SHARD_MB
     if metadata is None: metadata = load_metadata()
     metadata.setdefault("cache", {})
     metadata.setdefault("chats", {})
     metadata.setdefault("ui_defaults", {})
+    metadata.setdefault("checkpoints", {})
     if h_map is None: h_map = get_handle_map()
 
-    start_ts = 0
-    if is_incremental:
-        last_meta = metadata.get("chats", {}).get(chat_guid)
-        if last_meta: start_ts = last_meta.get("ts", 0) + 1000
+    job = {"format": format_ext, "compression": compression, "shard_mb": shard_mb, "incremental": bool(is_incremental)}
+    checkpoint = metadata["checkpoints"].get(chat_guid)
+    if checkpoint and any(checkpoint.get(k) != v for k, v in job.items()):
+        checkpoint = None # export settings changed; start over
+    if checkpoint:
+        start_ts = checkpoint.get("start_ts", 0)
+    else:
+        start_ts = 0
+        if is_incremental:
+            last_meta = metadata.get("chats", {}).get(chat_guid)
+            if last_meta: start_ts = last_meta.get("ts", 0) + 1000
+        checkpoint = dict(job, start_ts=start_ts, attachments={}, output={})
 
     conn = get_db_connection()
-    cur = conn.cursor()
-    
-    c_sql = """
-    SELECT c.display_name,
-    (SELECT GROUP_CONCAT(h2.id) FROM handle h2 JOIN chat_handle_join chj ON h2.ROWID = chj.handle_id WHERE chj.chat_id = c.ROWID) as participant_handles
-    FROM chat c WHERE c.guid = ?
-    """
-    c_row = cur.execute(c_sql, (chat_guid,)).fetchone()
+    c_row = run_query_one(conn, CHAT_INFO_SQL, (chat_guid,), name="engine.chat_info")
     folder_name = "Unknown_Chat"
     if c_row:
-        handles = (c_row[1] or "").split(",")
-        names = [resolve_name(h, h_map) for h in handles if h]
-        p_names = ", ".join(names)
-        folder_name = c_row[0] or p_names or "Unknown_Chat"
+        folder_name = c_row.display_name or c_row.participant_names or "Unknown_Chat"
     
     safe_folder_name = "".join(c for c in folder_name if c.isalnum() or c in " ._-")
     safe_folder_name = safe_folder_name.strip()[:100]
@@ -153,100 +467,211 @@ def archive_chat(chat_guid, format_ext, is_incremental, metadata=None, h_map=Non
     contact_out_dir = os.path.join(OUT_DIR, safe_folder_name)
     os.makedirs(contact_out_dir, exist_ok=True)
 
-    sql = """
-    SELECT m.ROWID as row_id, m.date as message_date, m.date_read, m.date_delivered, m.is_from_me,
-           m.text, m.attributedBody, m.service, m.associated_message_type, m.guid,
-           h.id as handle_id, a.filename as att_path, a.mime_type as att_mime, m.is_audio_message
-    FROM message m
-    JOIN chat_message_join cmj ON m.ROWID = cmj.message_id
-    JOIN chat c ON cmj.chat_id = c.ROWID
-    LEFT JOIN handle h ON m.handle_id = h.ROWID
-    LEFT JOIN message_attachment_join maj ON m.ROWID = maj.message_id
-    LEFT JOIN attachment a ON maj.attachment_id = a.ROWID
-    WHERE c.guid = ? AND m.date >= ? ORDER BY m.date ASC
-    """
-    rows_raw = [dict(r) for r in cur.execute(sql, (chat_guid, start_ts))]
+    rows_raw = run_query(conn, ARCHIVE_MESSAGES_SQL, (chat_guid, start_ts), name="engine.archive_messages")
     conn.close()
     
-    if not rows_raw: return None, 0
+    if not rows_raw:
+        if metadata["checkpoints"].pop(chat_guid, None):
+            _update_metadata(lambda data: data["checkpoints"].pop(chat_guid, None))
+        return None, 0
 
+    # One record per message; attachment rows and senders live in side tables so
+    # the records themselves stay immutable tuples.
     messages = {}
+    attachments = {}
+    senders = {}
+    associations = AssociationIndex()
+    home = os.path.expanduser("~")
     for r in rows_raw:
-        rid = r["row_id"]
+        rid = r.row_id
         if rid not in messages:
             messages[rid] = r
-            messages[rid]["attachments"] = []
-        if r["att_path"]: 
-            messages[rid]["attachments"].append({
-                "path": r["att_path"].replace("~", os.path.expanduser("~")), 
-                "mime": r["att_mime"]
-            })
+            if r.handle_id not in senders: senders[r.handle_id] = resolve_name(r.handle_id, h_map)
+            associations.add(r.associated_message_type, r.associated_message_guid, r.thread_originator_guid,
+                             "Me" if r.is_from_me else senders[r.handle_id])
+        if r.att_path:
+            attachments.setdefault(rid, []).append((r.att_path.replace("~", home), r.att_mime))
+    del rows_raw
     
-    msg_list = sorted(messages.values(), key=lambda x: x["message_date"])
+    msg_list = sorted(messages.values(), key=lambda x: (x.message_date, x.row_id))
+    del messages
+
+    with _ACTIVE_LOCK:
+        if chat_guid in _ACTIVE_EXPORTS:
+            raise RuntimeError("An export for this chat is already running")
+        _ACTIVE_EXPORTS.add(chat_guid)
+    checkpoint["status"] = "running"
+    checkpoint.pop("error", None)
+    try:
+        out_file, total = _run_export(chat_guid, msg_list, attachments, senders, associations, checkpoint, metadata, progress_callback,
+                                      contact_out_dir, folder_name, format_ext, compression, shard_mb)
+    except BaseException as e:
+        checkpoint["status"] = "interrupted"
+        checkpoint["error"] = redact_path(str(e)) or type(e).__name__
+        _save_checkpoint(metadata, chat_guid, checkpoint)
+        raise
+    finally:
+        with _ACTIVE_LOCK:
+            _ACTIVE_EXPORTS.discard(chat_guid)
+
+    last_msg = msg_list[-1]
+    metadata["checkpoints"].pop(chat_guid, None)
+    metadata["chats"][chat_guid] = {"ts": last_msg.message_date, "iso": mac_timestamp_to_iso(last_msg.message_date),
+                                    "manifest": f"{checkpoint['output']['base']}.manifest.json"}
+    cache = dict(metadata["cache"])
+
+    def finish(data):
+        data["checkpoints"].pop(chat_guid, None)
+        data["chats"][chat_guid] = metadata["chats"][chat_guid]
+        data["cache"].update(cache)
+    _update_metadata(finish)
     
+    return out_file, total
+
+def _run_export(chat_guid, msg_list, attachments, senders, associations, checkpoint, metadata, progress_callback,
+                contact_out_dir, folder_name, format_ext, compression, shard_mb):
+    """Attachment + output phases of archive_chat, checkpointing as they go."""
+    done = checkpoint["attachments"]
     results_map = {}
+    for key, res in done.items():
+        results_map.setdefault(int(key.split("|", 1)[0]), []).append(tuple(res))
+
     with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-        futures = []
+        futures = {}
         for m in msg_list:
-            iso = mac_timestamp_to_iso(m["message_date"])
-            for att in m["attachments"]:
-                futures.append(executor.submit(process_attachment_task, m["row_id"], att["path"], att["mime"], iso, contact_out_dir, metadata))
-        
-        for f in concurrent.futures.as_completed(futures):
-            rid, path, xtra = f.result()
-            if rid not in results_map: results_map[rid] = []
-            results_map[rid].append((path, xtra))
+            if m.row_id not in attachments: continue
+            iso = mac_timestamp_to_iso(m.message_date)
+            for path, mime in attachments[m.row_id]:
+                key = f"{m.row_id}|{path}"
+                if key in done: continue
+                futures[executor.submit(process_attachment_task, m.row_id, path, mime, iso, contact_out_dir, metadata)] = key
+
+        last_commit = time.monotonic()
+        try:
+            for f in concurrent.futures.as_completed(futures):
+                rid, path, xtra, info = f.result()
+                if rid not in results_map: results_map[rid] = []
+                results_map[rid].append((path, xtra))
+                done[futures[f]] = [path, xtra, info]
+                if time.monotonic() - last_commit >= CHECKPOINT_INTERVAL:
+                    _save_checkpoint(metadata, chat_guid, checkpoint)
+                    last_commit = time.monotonic()
+        except BaseException:
+            for f in futures: f.cancel()
+            raise
 
-    final_data = []
     total = len(msg_list)
-    for i, m in enumerate(msg_list):
-        if progress_callback: progress_callback(i, total)
+    output = checkpoint["output"]
+    resume_after = (output["last_date"], output["last_row_id"]) if "last_row_id" in output else None
 
-        att_res = results_map.get(m["row_id"], [])
-        rel_paths = [r[0] for r in att_res if r[0]]
-        extras = "".join([r[1] for r in att_res if r[1]])
-        
-        is_me = m["is_from_me"]
-        sender = "Me" if is_me else resolve_name(m["handle_id"], h_map)
-        text_content = (decode_body(m["text"], m["attributedBody"]) + extras).strip()
-        
-        reaction = REACTION_MAP.get(m["associated_message_type"] or 0, "")
-        
-        entry = {
-            "timestamp": mac_timestamp_to_iso(m["message_date"]),
-            "sender": sender,
-            "sender_handle": m["handle_id"] or "",
-            "text": text_content,
-            "attachments": " | ".join(rel_paths),
-            "guid": m["guid"],
-            "service": m["service"],
-            "is_from_me": bool(is_me),
-            "reaction_type": reaction,
-        }
-        final_data.append(entry)
+    def iter_entries():
+        for i, m in enumerate(msg_list):
+            if resume_after and (m.message_date, m.row_id) <= resume_after: continue
+            if progress_callback: progress_callback(i, total)
+
+            att_res = results_map.get(m.row_id, ())
+            rel_paths = [r[0] for r in att_res if r[0]]
+            extras = "".join([r[1] for r in att_res if r[1]])
+
+            is_me = m.is_from_me
+            text_content = (decode_body(m.text, m.attributedBody) + extras).strip()
+
+            reaction = REACTION_MAP.get(m.associated_message_type or 0, "")
+
+            entry = ExportRecord(
+                mac_timestamp_to_iso(m.message_date),
+                "Me" if is_me else senders[m.handle_id],
+                m.handle_id or "",
+                text_content,
+                " | ".join(rel_paths),
+                m.guid,
+                m.service,
+                bool(is_me),
+                reaction,
+                parse_associated_guid(m.associated_message_guid) if reaction else "",
+                associations.reactions(m.guid),
+                associations.thread_id(m.guid, m.thread_originator_guid),
+            )
+            yield m.row_id, m.message_date, entry
+
+    inventory = sorted((res[2] for res in done.values() if len(res) > 2), key=lambda a: (a["row_id"], a["source"]))
+    status_counts = {}
+    for a in inventory: status_counts[a["status"]] = status_counts.get(a["status"], 0) + 1
+    manifest_extra = {
+        "chat_guid": chat_guid,
+        "message_count": total,
+        "first_row_id": msg_list[0].row_id,
+        "last_row_id": msg_list[-1].row_id,
+        "first_iso": mac_timestamp_to_iso(msg_list[0].message_date),
+        "last_iso": mac_timestamp_to_iso(msg_list[-1].message_date),
+        "attachment_count": len(inventory),
+        "attachment_status": status_counts,
+        "attachments": inventory,
+    }
 
     use_ts_name = os.environ.get("TIMESTAMP_FILENAME") == "1"
-    out_file = _unique_output_path(contact_out_dir, "chat_export", format_ext, force_timestamp=use_ts_name)
+    out_file = write_export(iter_entries(), contact_out_dir, format_ext, folder_name,
+                            compression=compression, shard_mb=shard_mb, force_timestamp=use_ts_name,
+                            state=output, on_checkpoint=lambda _: _save_checkpoint(metadata, chat_guid, checkpoint),
+                            manifest_extra=manifest_extra)
+    return out_file, total
 
-    if format_ext == "csv":
-        with open(out_file, "w", newline="", encoding="utf-8") as f:
-            fields = ["timestamp", "sender", "text", "attachments", "guid", "service", "reaction_type", "sender_handle", "is_from_me"]
-            w = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
-            w.writeheader()
-            w.writerows(final_data)
-    elif format_ext == "json":
-        with open(out_file, "w", encoding="utf-8") as f: json.dump(final_data, f, indent=2)
-    elif format_ext == "md":
-        with open(out_file, "w", encoding="utf-8") as f:
-            f.write(f"# Chat: {folder_name}\n\n")
-            for d in final_data: 
-                f.write(f"**[{d['timestamp']}] {d['sender']}:** {d['text']}\n\n")
+def _update_metadata(update):
+    """Apply ``update(data)`` to a freshly loaded metadata.json and save it.
 
-    last_msg = msg_list[-1]
-    metadata["chats"][chat_guid] = {"ts": last_msg["message_date"], "iso": mac_timestamp_to_iso(last_msg["message_date"])}
-    save_metadata(metadata)
-    
-    return out_file, len(final_data)
+    Concurrent exports each hold their own metadata copy; merging into the file
+    under a lock keeps them from overwriting each other's entries.
+    """
+    with _METADATA_LOCK:
+        data = load_metadata()
+        update(data)
+        save_metadata(data)
+
+def _save_checkpoint(metadata, chat_guid, checkpoint):
+    checkpoint["updated"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    metadata.setdefault("checkpoints", {})[chat_guid] = checkpoint
+
+    def store(data):
+        data["checkpoints"][chat_guid] = checkpoint
+    _update_metadata(store)
+
+def list_export_checkpoints(metadata=None):
+    """Describe checkpointed exports that are not currently running in this process."""
+    if metadata is None: metadata = load_metadata()
+    jobs = []
+    for chat_guid, cp in metadata.get("checkpoints", {}).items():
+        if chat_guid in _ACTIVE_EXPORTS: continue
+        output = cp.get("output", {})
+        jobs.append({
+            "chat_guid": chat_guid,
+            "format": cp.get("format"),
+            "compression": cp.get("compression"),
+            "shard_mb": cp.get("shard_mb"),
+            "incremental": cp.get("incremental"),
+            "status": "interrupted",
+            "error": cp.get("error"),
+            "updated": cp.get("updated"),
+            "attachments_done": len(cp.get("attachments", {})),
+            "last_row_id": output.get("last_row_id"),
+            "parts_written": len(output.get("shards", [])),
+        })
+    return jobs
+
+def resume_export(chat_guid, metadata=None, h_map=None, progress_callback=None):
+    """Resume an interrupted export with the settings it was started with."""
+    if metadata is None: metadata = load_metadata()
+    cp = metadata.get("checkpoints", {}).get(chat_guid)
+    if not cp:
+        raise KeyError(chat_guid)
+    return archive_chat(chat_guid, cp["format"], cp["incremental"], metadata=metadata, h_map=h_map,
+                        progress_callback=progress_callback, compression=cp["compression"], shard_mb=cp["shard_mb"])
+
+def discard_export_checkpoint(chat_guid, metadata=None):
+    if metadata is None: metadata = load_metadata()
+    if chat_guid in _ACTIVE_EXPORTS or metadata.get("checkpoints", {}).pop(chat_guid, None) is None:
+        return False
+    _update_metadata(lambda data: data["checkpoints"].pop(chat_guid, None))
+    return True
 
 def archive_chat_profiled(*args, **kwargs):
     """Wrapper to run archive_chat with a profiler."""
@@ -270,29 +695,19 @@ def archive_chat_profiled(*args, **kwargs):
 def get_global_stats():
     """Calculates global statistics from the database."""
     conn = get_db_connection()
-    cur = conn.cursor()
     
     # Total messages
-    cur.execute("SELECT COUNT(*) FROM message")
-    total_messages = cur.fetchone()[0]
+    total_messages = run_query_one(conn, "SELECT COUNT(*) FROM message", name="stats.total_messages")[0]
     
     # Total chats
-    cur.execute("SELECT COUNT(*) FROM chat")
-    total_chats = cur.fetchone()[0]
+    total_chats = run_query_one(conn, "SELECT COUNT(*) FROM chat", name="stats.total_chats")[0]
     
     # Top contact
-    sql_top = """
-    SELECT h.id, COUNT(*) as cnt 
-    FROM message m 
-    JOIN handle h ON m.handle_id = h.ROWID 
-    WHERE m.is_from_me = 0 
-    GROUP BY h.id 
-    ORDER BY cnt DESC 
-    LIMIT 1
-    """
-    row = cur.execute(sql_top).fetchone()
-    top_contact = row[0] if row else "N/A"
-    top_count = row[1] if row else 0
+    row = run_query_one(conn, TOP_CONTACT_SQL, name="engine.top_contact")
+    top_contact = row.handle if row else "N/A"
+    top_count = row.cnt if row else 0
+    top_name = (row.name or row.handle) if row else "N/A"
+    top_person = row.person_id if row else None
     
     conn.close()
     
@@ -300,5 +715,7 @@ def get_global_stats():
         "total_messages": total_messages,
         "total_chats": total_chats,
         "top_contact_handle": top_contact,
-        "top_contact_count": top_count
+        "top_contact_count": top_count,
+        "top_contact_name": top_name,
+        "top_contact_person_id": top_person
     }
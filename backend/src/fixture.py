@@ -0,0 +1,120 @@
+import os
+import random
+import sqlite3
+import sys
+
+# The subset of Apple's chat.db schema the archiver reads, with chat.db's own index names
+# so query plans match a real database.
+CHAT_DB_SCHEMA = """
+    CREATE TABLE handle (ROWID INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE, id TEXT NOT NULL, country TEXT, service TEXT NOT NULL,
+        uncanonicalized_id TEXT, person_centric_id TEXT, UNIQUE (id, service));
+    CREATE TABLE chat (ROWID INTEGER PRIMARY KEY AUTOINCREMENT, guid TEXT UNIQUE NOT NULL, style INTEGER, state INTEGER,
+        chat_identifier TEXT, service_name TEXT, display_name TEXT, is_archived INTEGER DEFAULT 0);
+    CREATE TABLE message (ROWID INTEGER PRIMARY KEY AUTOINCREMENT, guid TEXT UNIQUE NOT NULL, text TEXT, attributedBody BLOB,
+        handle_id INTEGER DEFAULT 0, service TEXT, date INTEGER, date_read INTEGER, date_delivered INTEGER,
+        is_from_me INTEGER DEFAULT 0, is_audio_message INTEGER DEFAULT 0, cache_has_attachments INTEGER DEFAULT 0,
+        associated_message_guid TEXT DEFAULT NULL, associated_message_type INTEGER DEFAULT 0,
+        reply_to_guid TEXT DEFAULT NULL, thread_originator_guid TEXT DEFAULT NULL);
+    CREATE TABLE attachment (ROWID INTEGER PRIMARY KEY AUTOINCREMENT, guid TEXT UNIQUE NOT NULL, created_date INTEGER DEFAULT 0,
+        filename TEXT, mime_type TEXT, transfer_name TEXT, total_bytes INTEGER DEFAULT 0);
+    CREATE TABLE chat_handle_join (chat_id INTEGER REFERENCES chat (ROWID) ON DELETE CASCADE,
+        handle_id INTEGER REFERENCES handle (ROWID) ON DELETE CASCADE, UNIQUE(chat_id, handle_id));
+    CREATE TABLE chat_message_join (chat_id INTEGER REFERENCES chat (ROWID) ON DELETE CASCADE,
+        message_id INTEGER REFERENCES message (ROWID) ON DELETE CASCADE, message_date INTEGER DEFAULT 0,
+        PRIMARY KEY (chat_id, message_id));
+    CREATE TABLE message_attachment_join (message_id INTEGER REFERENCES message (ROWID) ON DELETE CASCADE,
+        attachment_id INTEGER REFERENCES attachment (ROWID) ON DELETE CASCADE, UNIQUE(message_id, attachment_id));
+    CREATE INDEX message_idx_handle ON message(handle_id, date);
+    CREATE INDEX message_idx_date ON message(date);
+    CREATE INDEX message_idx_associated_message ON message(associated_message_guid);
+    CREATE INDEX chat_message_join_idx_message_date_id_chat_id ON chat_message_join(chat_id, message_date, message_id);
+    CREATE INDEX chat_message_join_idx_message_id_only ON chat_message_join(message_id);
+    CREATE INDEX message_attachment_join_idx_message_id ON message_attachment_join(message_id);
+    CREATE INDEX chat_handle_join_idx_handle_id ON chat_handle_join(handle_id);
+"""
+
+# One number on both SMS and iMessage, an email for the same person, and a second contact.
+HANDLES = [("+15551234567", "iMessage"), ("+15551234567", "SMS"), ("friend@example.com", "iMessage"), ("+15559876543", "SMS")]
+CHATS = [("chat-1", 45, "+15551234567", ""), ("chat-2", 43, "chat-group", "Group")]
+CHAT_HANDLES = {1: (1, 2), 2: (1, 3, 4)}
+
+# The AddressBook tables identity reads. One card owns the number (as typed, unnormalized) and the
+# email, so handles 1-3 fold into one person; handle 4 has no card.
+ADDRESSBOOK_SCHEMA = """
+    CREATE TABLE ZABCDRECORD (Z_PK INTEGER PRIMARY KEY, ZFIRSTNAME VARCHAR, ZLASTNAME VARCHAR, ZORGANIZATION VARCHAR);
+    CREATE TABLE ZABCDPHONENUMBER (Z_PK INTEGER PRIMARY KEY, ZOWNER INTEGER, ZFULLNUMBER VARCHAR);
+    CREATE TABLE ZABCDEMAILADDRESS (Z_PK INTEGER PRIMARY KEY, ZOWNER INTEGER, ZADDRESS VARCHAR);
+"""
+CONTACTS = [("Alex", "Friend", ["(555) 123-4567"], ["Friend@example.com"])]
+
+def build_fixture(path, messages=3000, seed=1):
+    """Write a deterministic synthetic chat.db (and its attachment files next to it).
+
+    Two thirds of the messages go to a 1:1 chat, the rest to a group chat, each
+    sent by a random participant's handle so every handle (SMS, iMessage, email)
+    has traffic. Every 17th is a tapback and every 23rd an inline reply, both
+    aimed at an earlier message of the same chat; every 50th carries a 2 KB
+    image attachment. Returns ``path``.
+    """
+    if os.path.exists(path): os.remove(path)
+    att_dir = os.path.splitext(os.path.abspath(path))[0] + "_attachments"
+    os.makedirs(att_dir, exist_ok=True)
+    rng = random.Random(seed)
+
+    conn = sqlite3.connect(path)
+    conn.executescript(CHAT_DB_SCHEMA)
+    conn.executemany("INSERT INTO handle (id, service) VALUES (?, ?)", HANDLES)
+    conn.executemany("INSERT INTO chat (guid, style, chat_identifier, display_name) VALUES (?, ?, ?, ?)", CHATS)
+    conn.executemany("INSERT INTO chat_handle_join VALUES (?, ?)", [(c, h) for c, hs in CHAT_HANDLES.items() for h in hs])
+
+    msg_rows, join_rows, att_rows, att_join_rows = [], [], [], []
+    chat_guids = {chat_id: [] for chat_id in CHAT_HANDLES} # message guids per chat, oldest first
+    date = 700_000_000 * 1_000_000_000 # Apple epoch nanoseconds (2023)
+    for i in range(1, messages + 1):
+        chat_id = 1 if i % 3 else 2
+        is_from_me = int(rng.random() < 0.4)
+        date += rng.randint(1, 600) * 1_000_000_000
+        handle_id = rng.choice(CHAT_HANDLES[chat_id])
+        earlier = chat_guids[chat_id]
+        assoc_type, assoc_guid, thread = 0, None, None
+        if len(earlier) > 5 and i % 17 == 0: assoc_type, assoc_guid = 2000 + i % 6, f"p:0/{earlier[-3]}"
+        if len(earlier) > 5 and i % 23 == 0: thread = earlier[-4]
+        earlier.append(f"msg-{i}")
+        msg_rows.append((i, f"msg-{i}", f"hello {i} " * 5, handle_id, HANDLES[handle_id - 1][1], date, is_from_me,
+                         assoc_type, assoc_guid, thread, int(i % 50 == 0)))
+        join_rows.append((chat_id, i, date))
+        if i % 50 == 0:
+            file_path = os.path.join(att_dir, f"img_{i}.jpg")
+            with open(file_path, "wb") as f: f.write(rng.randbytes(2048))
+            att_rows.append((len(att_rows) + 1, f"att-{i}", date, file_path, "image/jpeg", f"img_{i}.jpg", 2048))
+            att_join_rows.append((i, len(att_rows)))
+
+    conn.executemany("""INSERT INTO message (ROWID, guid, text, handle_id, service, date, is_from_me, associated_message_type,
+                        associated_message_guid, thread_originator_guid, cache_has_attachments) VALUES (?,?,?,?,?,?,?,?,?,?,?)""", msg_rows)
+    conn.executemany("INSERT INTO chat_message_join VALUES (?, ?, ?)", join_rows)
+    conn.executemany("INSERT INTO attachment (ROWID, guid, created_date, filename, mime_type, transfer_name, total_bytes) VALUES (?,?,?,?,?,?,?)", att_rows)
+    conn.executemany("INSERT INTO message_attachment_join VALUES (?, ?)", att_join_rows)
+    conn.commit()
+    conn.close()
+    return path
+
+def build_addressbook(path):
+    """Write a minimal AddressBook ``.abcddb`` holding CONTACTS. Returns ``path``."""
+    if os.path.exists(path): os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.executescript(ADDRESSBOOK_SCHEMA)
+    for pk, (first, last, phones, emails) in enumerate(CONTACTS, 1):
+        conn.execute("INSERT INTO ZABCDRECORD VALUES (?, ?, ?, NULL)", (pk, first, last))
+        conn.executemany("INSERT INTO ZABCDPHONENUMBER (ZOWNER, ZFULLNUMBER) VALUES (?, ?)", [(pk, n) for n in phones])
+        conn.executemany("INSERT INTO ZABCDEMAILADDRESS (ZOWNER, ZADDRESS) VALUES (?, ?)", [(pk, e) for e in emails])
+    conn.commit()
+    conn.close()
+    return path
+
+if __name__ == "__main__":
+    # python3 -m backend.src.fixture path/to/chat.db [message count]
+    out = build_fixture(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 3000)
+    contacts_dir = os.path.splitext(os.path.abspath(out))[0] + "_contacts"
+    os.makedirs(contacts_dir, exist_ok=True)
+    build_addressbook(os.path.join(contacts_dir, "fixture.abcddb"))
+    print(f"Wrote {out} (TMP_CONTACTS_DIR={contacts_dir})")
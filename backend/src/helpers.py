@@ -3,7 +3,9 @@ import plistlib
 import re
 import hashlib
 import os
+import shutil
 import re
+from .config import REACTION_MAP
 
 def redact_path(path):
     if not path:
@@ -75,3 +77,79 @@ def get_file_hash(path):
         stat = os.stat(path)
         return hashlib.md5(f"{path}:{stat.st_mtime}:{stat.st_size}".encode()).hexdigest()
     except: return None
+
+HASH_CHUNK = 1024 * 1024
+
+def sha256_file(path):
+    """Return (size, sha256 hex) of a file's content."""
+    h = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK)
+            if not chunk: break
+            h.update(chunk)
+            size += len(chunk)
+    return size, h.hexdigest()
+
+def copy_with_sha256(src, dest):
+    """Copy src to dest (with metadata, like shutil.copy2) hashing the bytes on the way.
+
+    Returns (size, sha256 hex) so callers get a content hash without a second read.
+    """
+    h = hashlib.sha256()
+    size = 0
+    with open(src, "rb") as fin, open(dest, "wb") as fout:
+        while True:
+            chunk = fin.read(HASH_CHUNK)
+            if not chunk: break
+            h.update(chunk)
+            fout.write(chunk)
+            size += len(chunk)
+    shutil.copystat(src, dest)
+    return size, h.hexdigest()
+
+def parse_associated_guid(guid):
+    """Strip the part prefix from associated_message_guid ("p:0/GUID", "bp:GUID")."""
+    if not guid: return ""
+    if "/" in guid: return guid.split("/", 1)[1]
+    if guid.startswith("bp:"): return guid[3:]
+    return guid
+
+class AssociationIndex:
+    """GUID-keyed hash join of tapbacks and thread replies onto their target messages.
+
+    Feed every message once with ``add``; lookups are then O(1) per message. Later
+    tapbacks from the same sender replace earlier ones, and 3000-series removals
+    clear them.
+    """
+
+    def __init__(self):
+        self._reactions = {} # target guid -> {sender: label}
+        self._originators = set()
+
+    def add(self, assoc_type, assoc_guid, thread_originator_guid, sender):
+        if thread_originator_guid: self._originators.add(thread_originator_guid)
+        label = REACTION_MAP.get(assoc_type or 0)
+        target = parse_associated_guid(assoc_guid)
+        if not label or not target: return
+        by_sender = self._reactions.setdefault(target, {})
+        if assoc_type >= 3000:
+            by_sender.pop(sender, None)
+        else:
+            by_sender[sender] = label
+
+    def reactions(self, guid):
+        """{label: [senders]} for the reactions currently standing on a message."""
+        grouped = {}
+        for sender, label in self._reactions.get(guid, {}).items():
+            grouped.setdefault(label, []).append(sender)
+        return grouped
+
+    def thread_id(self, guid, thread_originator_guid):
+        """Thread root guid for replies and for messages that were replied to, else ""."""
+        if thread_originator_guid: return thread_originator_guid
+        return guid if guid in self._originators else ""
+
+def format_reactions(reactions):
+    return "; ".join(f"{label}: {', '.join(senders)}" for label, senders in reactions.items())
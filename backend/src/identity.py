@@ -0,0 +1,192 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from .config import TMP_CONTACTS_DIR, CONTACT_INDEX_DB
+from .helpers import normalize_handle
+from .query import run_query
+
+SCHEMA = "identity" # name the index is attached under on working DB connections
+
+_INDEX_DDL = """
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    CREATE TABLE IF NOT EXISTS person (person_id TEXT PRIMARY KEY, name TEXT NOT NULL) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS person_address (address TEXT PRIMARY KEY, person_id TEXT NOT NULL) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS person_handle (handle_rowid INTEGER PRIMARY KEY, person_id TEXT NOT NULL);
+    CREATE INDEX IF NOT EXISTS person_handle_idx_person ON person_handle(person_id, handle_rowid);
+"""
+
+_lock = threading.Lock()
+_fresh = {} # index part -> signature known to be current in the index file
+
+def address_key(handle):
+    """Normalized address used to match handles to contacts (falls back to the raw id, lowercased)."""
+    return normalize_handle(handle) or (handle or "").strip().lower()
+
+def person_id_for(address):
+    """Stable id for the person owning ``address`` (their smallest normalized address)."""
+    return hashlib.sha1(address.encode("utf-8")).hexdigest()[:16]
+
+def _addressbook_files():
+    if not TMP_CONTACTS_DIR or not os.path.isdir(TMP_CONTACTS_DIR): return []
+    return sorted(os.path.join(TMP_CONTACTS_DIR, n) for n in os.listdir(TMP_CONTACTS_DIR) if n.endswith(".abcddb"))
+
+def _addressbook_signature(files):
+    sig = []
+    for path in files:
+        try:
+            st = os.stat(path)
+            sig.append(f"{os.path.basename(path)}:{st.st_mtime_ns}:{st.st_size}")
+        except OSError:
+            continue
+    return "|".join(sig)
+
+def _read_contacts(files):
+    """Yield ``(name, [addresses])`` per AddressBook record across all source databases."""
+    for path in files:
+        try:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        except sqlite3.Error:
+            continue
+        try:
+            records = {}
+            for pk, first, last, org in run_query(conn, "SELECT Z_PK, ZFIRSTNAME, ZLASTNAME, ZORGANIZATION FROM ZABCDRECORD", name="contacts.records"):
+                records[pk] = (" ".join(filter(None, [first, last])) or org, [])
+            for owner, addr in run_query(conn, "SELECT ZOWNER, ZFULLNUMBER FROM ZABCDPHONENUMBER", name="contacts.phones"):
+                if owner in records and addr: records[owner][1].append(addr)
+            for owner, addr in run_query(conn, "SELECT ZOWNER, ZADDRESS FROM ZABCDEMAILADDRESS", name="contacts.emails"):
+                if owner in records and addr: records[owner][1].append(addr)
+        except sqlite3.Error:
+            continue
+        finally:
+            conn.close()
+        for name, addrs in records.values():
+            keys = [k for k in (address_key(a) for a in addrs) if k]
+            if name and keys: yield name, keys
+
+def _name_key(name):
+    return " ".join(name.split()).casefold()
+
+def build_people(contacts):
+    """Merge contact records that share an address into people.
+
+    Returns ``{person_id: (name, sorted addresses)}``. The same person is often
+    split across sources (iCloud, On My Mac, Exchange) or has one card per
+    phone/email; they collapse into one person named after the first record.
+    An address on cards with different names (a household landline, an office
+    switchboard) joins nobody: it becomes its own entry named after all of them.
+    """
+    contacts = list(contacts)
+    claimants = {} # address -> {name key: name}, first seen first
+    for name, keys in contacts:
+        for k in keys: claimants.setdefault(k, {}).setdefault(_name_key(name), name)
+
+    parent = {}
+    def find(a):
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    names = {} # group root -> (record order, name); the earliest record names the person
+    for order, (name, keys) in enumerate(contacts):
+        keys = [k for k in keys if len(claimants[k]) == 1]
+        if not keys: continue
+        for k in keys: parent.setdefault(k, k)
+        root = find(keys[0])
+        names.setdefault(root, (order, name))
+        for k in keys[1:]:
+            other = find(k)
+            if other == root: continue
+            parent[other] = root
+            if other in names: names[root] = min(names[root], names.pop(other))
+
+    groups = {}
+    for k in parent: groups.setdefault(find(k), []).append(k)
+    people = {}
+    for root, addrs in groups.items():
+        addrs.sort()
+        people[person_id_for(addrs[0])] = (names[root][1], addrs)
+    for k, by_name in claimants.items():
+        if len(by_name) > 1: people[person_id_for(k)] = (" / ".join(by_name.values()), [k])
+    return people
+
+def _open_index():
+    os.makedirs(os.path.dirname(CONTACT_INDEX_DB) or ".", exist_ok=True)
+    conn = sqlite3.connect(CONTACT_INDEX_DB, timeout=30)
+    try:
+        os.chmod(CONTACT_INDEX_DB, 0o600)
+    except Exception:
+        pass
+    conn.execute("PRAGMA journal_mode=WAL") # readers attached elsewhere don't block a rebuild
+    conn.executescript(_INDEX_DDL)
+    return conn
+
+def _stored(idx, key):
+    row = idx.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+def _sync_contacts(idx):
+    """Rebuild person/person_address when the AddressBook databases change."""
+    files = _addressbook_files()
+    sig = _addressbook_signature(files)
+    if _fresh.get("contacts") == sig: return
+    if _stored(idx, "contacts") != sig:
+        people = build_people(_read_contacts(files))
+        with idx:
+            idx.execute("DELETE FROM person")
+            idx.execute("DELETE FROM person_address")
+            idx.executemany("INSERT INTO person VALUES (?, ?)", ((pid, name) for pid, (name, _) in people.items()))
+            idx.executemany("INSERT INTO person_address VALUES (?, ?)",
+                            ((a, pid) for pid, (_, addrs) in people.items() for a in addrs))
+            idx.execute("INSERT OR REPLACE INTO meta VALUES ('contacts', ?)", (sig,))
+            idx.execute("DELETE FROM meta WHERE key = 'handles'") # handle -> person ids may have moved
+        print(f"Contact index: {len(people)} people from {len(files)} address books")
+        _fresh.pop("handles", None)
+    _fresh["contacts"] = sig
+
+def _sync_handles(idx, conn, db_key):
+    """Rebuild person_handle when the working DB's handle table changes."""
+    count, max_rowid = run_query(conn, "SELECT COUNT(*), COALESCE(MAX(ROWID), 0) FROM handle", name="identity.handle_signature")[0]
+    sig = f"{db_key}:{count}:{max_rowid}"
+    if _fresh.get("handles") == sig: return
+    if _stored(idx, "handles") != sig:
+        by_address = dict(idx.execute("SELECT address, person_id FROM person_address"))
+        rows = []
+        for rowid, hid in run_query(conn, "SELECT ROWID, id FROM handle", name="identity.handles"):
+            key = address_key(hid)
+            if not key: continue
+            # Handles with no contact card still merge by address (SMS vs iMessage rows, +1 prefixes).
+            rows.append((rowid, by_address.get(key) or person_id_for(key)))
+        with idx:
+            idx.execute("DELETE FROM person_handle")
+            idx.executemany("INSERT INTO person_handle VALUES (?, ?)", rows)
+            idx.execute("INSERT OR REPLACE INTO meta VALUES ('handles', ?)", (sig,))
+    _fresh["handles"] = sig
+
+def attach_identity_index(conn, db_key=""):
+    """Bring the index up to date for ``conn``'s chat.db and attach it as ``identity``.
+
+    Afterwards ``identity.person_handle`` maps ``handle.ROWID`` to a person id and
+    ``identity.person`` holds display names, so per-person aggregates join in SQL.
+    ``db_key`` identifies the working database so a different copy resyncs handles.
+    """
+    with _lock:
+        idx = _open_index()
+        try:
+            _sync_contacts(idx)
+            _sync_handles(idx, conn, db_key)
+        finally:
+            idx.close()
+    conn.execute(f"ATTACH DATABASE ? AS {SCHEMA}", (CONTACT_INDEX_DB,))
+    return conn
+
+def get_address_names():
+    """``{normalized address: person name}`` for every contact address."""
+    with _lock:
+        idx = _open_index()
+        try:
+            _sync_contacts(idx)
+            return dict(idx.execute("SELECT pa.address, p.name FROM person_address pa JOIN person p ON p.person_id = pa.person_id"))
+        finally:
+            idx.close()
@@ -0,0 +1,40 @@
+import os
+import sqlite3
+import sys
+import tempfile
+
+def main(argv):
+    """Check every registered hot query's plan; returns the process exit code.
+
+    With no chat.db argument a synthetic fixture is generated in a temp directory,
+    together with its own contact index, so the check runs anywhere.
+    """
+    from . import db, analytics, engine, watcher, identity  # noqa: F401 -- registers hot queries
+    from .query import HOT_QUERIES, check_hot_queries
+    from .fixture import build_addressbook, build_fixture
+
+    args = [a for a in argv if not a.startswith("--")]
+    messages = next((int(a.split("=", 1)[1]) for a in argv if a.startswith("--messages=")), 3000)
+    if args:
+        path = args[0]
+    else:
+        tmp = tempfile.mkdtemp(prefix="imessage_plancheck_")
+        # config is already loaded by the package import; keep the fixture's index out of the user's cache.
+        identity.CONTACT_INDEX_DB = os.path.join(tmp, "contact_index.db")
+        identity.TMP_CONTACTS_DIR = tmp
+        build_addressbook(os.path.join(tmp, "fixture.abcddb"))
+        path = build_fixture(os.path.join(tmp, "chat.db"), messages)
+        print(f"Fixture: {messages} messages at {path}")
+
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    identity.attach_identity_index(conn, os.path.abspath(path))
+    failures = check_hot_queries(conn)
+    conn.close()
+    for name in sorted(HOT_QUERIES):
+        print(f"{'FAIL' if name in failures else 'ok  '} {name}")
+        for detail in failures.get(name, []): print(f"       {detail}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    # python3 -m backend.src.plancheck [path/to/chat.db] [--messages=N]
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,102 @@
+import re
+import sqlite3
+import threading
+import time
+from .config import SLOW_QUERY_MS, QUERY_PLAN_STRICT
+
+# name -> (sql, sample_params, tables allowed to be scanned)
+HOT_QUERIES = {}
+
+_stats = {}
+_stats_lock = threading.Lock()
+_checked = set()
+
+_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?(.*)$")
+
+class QueryPlanError(RuntimeError):
+    pass
+
+def register_hot_query(name, sql, sample_params=(), allow_scan=()):
+    """Mark a statement as latency-sensitive so its plan is guarded against full table scans.
+
+    ``allow_scan`` lists tables (or aliases) whose full scan is inherent to the query,
+    e.g. the driving table of a whole-database aggregate.
+    """
+    HOT_QUERIES[name] = (sql, tuple(sample_params), frozenset(allow_scan))
+    return sql
+
+def explain(conn, sql, params=()):
+    return [r[3] for r in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+def full_scans(plan, allow_scan=()):
+    """Tables in an EXPLAIN QUERY PLAN that are read without any index."""
+    # Scanning a materialized subquery or co-routine reads a temp result, not a table.
+    derived = {d.split(" ", 1)[1].split(" ")[0] for d in plan if d.startswith(("MATERIALIZE ", "CO-ROUTINE "))}
+    scans = []
+    for detail in plan:
+        m = _SCAN_RE.match(detail)
+        if not m or "INDEX" in m.group(3): continue
+        table, alias = m.group(1), m.group(2)
+        if table in derived or table in allow_scan or (alias and alias in allow_scan): continue
+        scans.append(detail)
+    return scans
+
+def _label(sql):
+    return " ".join(sql.split())[:80]
+
+def run_query(conn, sql, params=(), name=None):
+    """Execute a statement and return all rows, recording its duration and row count.
+
+    Statements slower than SLOW_QUERY_MS are logged with their query plan. With
+    QUERY_PLAN_STRICT=1, a registered hot query whose plan contains a full table
+    scan raises QueryPlanError the first time it runs.
+    """
+    if QUERY_PLAN_STRICT and name in HOT_QUERIES and name not in _checked:
+        scans = full_scans(explain(conn, sql, params), HOT_QUERIES[name][2])
+        if scans:
+            raise QueryPlanError(f"Hot query '{name}' falls back to a full scan: {'; '.join(scans)}")
+        _checked.add(name)
+
+    start = time.perf_counter()
+    rows = conn.execute(sql, params).fetchall()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    key = name or _label(sql)
+    with _stats_lock:
+        st = _stats.setdefault(key, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "slow": 0})
+        st["calls"] += 1
+        st["total_ms"] += elapsed_ms
+        st["max_ms"] = max(st["max_ms"], elapsed_ms)
+        st["rows"] += len(rows)
+        if elapsed_ms >= SLOW_QUERY_MS: st["slow"] += 1
+
+    if elapsed_ms >= SLOW_QUERY_MS:
+        try:
+            plan = " | ".join(explain(conn, sql, params))
+        except sqlite3.Error:
+            plan = "unavailable"
+        print(f"[slow query] {key}: {elapsed_ms:.1f} ms, {len(rows)} rows; plan: {plan}")
+    return rows
+
+def run_query_one(conn, sql, params=(), name=None):
+    rows = run_query(conn, sql, params, name=name)
+    return rows[0] if rows else None
+
+def query_stats():
+    """Per-statement timing totals since startup, slowest total first."""
+    with _stats_lock:
+        items = [dict(st, query=key) for key, st in _stats.items()]
+    for st in items:
+        st["avg_ms"] = round(st["total_ms"] / st["calls"], 3)
+        st["total_ms"] = round(st["total_ms"], 3)
+        st["max_ms"] = round(st["max_ms"], 3)
+    return sorted(items, key=lambda st: st["total_ms"], reverse=True)
+
+def check_hot_queries(conn):
+    """Return {name: [full scan details]} for every registered hot query that scans."""
+    failures = {}
+    for name, (sql, params, allow) in sorted(HOT_QUERIES.items()):
+        scans = full_scans(explain(conn, sql, params), allow)
+        if scans: failures[name] = scans
+    return failures
+
@@ -0,0 +1,22 @@
+from collections import namedtuple
+
+_RECORD_TYPES = {} # id(cursor.description) -> (description, record class)
+_MAX_CACHED = 256
+
+def record_type(columns):
+    """Tuple-backed record class with attribute access for a result column list."""
+    return namedtuple("Record", columns, rename=True)
+
+def record_factory(cursor, row):
+    """sqlite3 row factory producing compact named tuples instead of dict-like rows.
+
+    One class is built per statement: sqlite3 hands every row of a statement the
+    same ``cursor.description`` object, so the lookup is an identity check.
+    """
+    desc = cursor.description
+    cached = _RECORD_TYPES.get(id(desc))
+    if cached is None or cached[0] is not desc:
+        if len(_RECORD_TYPES) >= _MAX_CACHED: _RECORD_TYPES.clear()
+        cached = (desc, record_type([d[0] for d in desc]))
+        _RECORD_TYPES[id(desc)] = cached
+    return tuple.__new__(cached[1], row)
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from .config import THUMB_CACHE_DIR, THUMB_CACHE_MB
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+THUMB_SIZES = {128, 256, 512}
+_lock = threading.Lock()
+_cache_bytes = None # lazily summed from disk on first store
+
+def thumbnail_key(att, size):
+    """Cache key for an attachment thumbnail: attachment identity plus source file state."""
+    path = att.get("filename") or ""
+    try:
+        st = os.stat(path)
+        state = f"{st.st_mtime_ns}:{st.st_size}"
+    except OSError:
+        return None
+    return hashlib.sha256(f"{att.get('guid')}:{path}:{state}:{size}".encode()).hexdigest()
+
+def _cache_path(key):
+    return os.path.join(THUMB_CACHE_DIR, key[:2], f"{key}.jpg")
+
+def _render(src, dest, mime, size):
+    """Write a JPEG preview of src to dest. Returns False when no renderer can handle it."""
+    mime = (mime or "").lower()
+    if mime.startswith("image/"):
+        if Image is not None:
+            try:
+                with Image.open(src) as img:
+                    img.thumbnail((size, size))
+                    img.convert("RGB").save(dest, "JPEG", quality=80)
+                return True
+            except Exception:
+                pass
+        if shutil.which("sips"):
+            # macOS built-in; also handles HEIC which Pillow may not.
+            res = subprocess.run(["sips", "-Z", str(size), "-s", "format", "jpeg", src, "--out", dest],
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            return res.returncode == 0 and os.path.exists(dest)
+        return False
+    if mime.startswith("video/") and shutil.which("qlmanage"):
+        out_dir = tempfile.mkdtemp(prefix="thumb_")
+        try:
+            subprocess.run(["qlmanage", "-t", "-s", str(size), "-o", out_dir, src],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30)
+            produced = os.path.join(out_dir, os.path.basename(src) + ".png")
+            if not os.path.exists(produced): return False
+            if Image is not None:
+                with Image.open(produced) as img:
+                    img.convert("RGB").save(dest, "JPEG", quality=80)
+                return True
+            res = subprocess.run(["sips", "-s", "format", "jpeg", produced, "--out", dest],
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            return res.returncode == 0 and os.path.exists(dest)
+        except subprocess.TimeoutExpired:
+            return False
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+    return False
+
+def _scan_cache():
+    total = 0
+    entries = []
+    for root, _, files in os.walk(THUMB_CACHE_DIR):
+        for name in files:
+            p = os.path.join(root, name)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            total += st.st_size
+            entries.append((st.st_mtime, st.st_size, p))
+    return total, entries
+
+def _enforce_cap(added):
+    global _cache_bytes
+    cap = THUMB_CACHE_MB * 1024 * 1024
+    with _lock:
+        if _cache_bytes is None:
+            _cache_bytes = _scan_cache()[0]
+        else:
+            _cache_bytes += added
+        if not cap or _cache_bytes <= cap: return
+        # Evict least recently served (mtime is bumped on every hit) down to 90% of the cap.
+        total, entries = _scan_cache()
+        for _, size, p in sorted(entries):
+            if total <= cap * 0.9: break
+            try:
+                os.remove(p)
+                total -= size
+            except OSError:
+                pass
+        _cache_bytes = total
+
+def get_thumbnail(att, size=256):
+    """Return ``(path, key)`` for a cached thumbnail, generating it on a miss.
+
+    Returns ``(None, None)`` when the original is gone or no renderer supports it.
+    """
+    key = thumbnail_key(att, size)
+    if not key: return None, None
+    path = _cache_path(key)
+    if os.path.exists(path):
+        try: os.utime(path)
+        except OSError: pass
+        return path, key
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix=".jpg", dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        if not _render(att["filename"], tmp, att.get("mime_type"), size) or not os.path.getsize(tmp):
+            return None, None
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp): os.remove(tmp)
+    _enforce_cap(os.path.getsize(path))
+    return path, key
@@ -0,0 +1,96 @@
+import concurrent.futures
+import json
+import os
+import sys
+from .helpers import sha256_file
+
+VERIFY_WORKERS = 8 # concurrent file checks; bounds disk I/O rather than CPU
+
+def _check_file(path, size, sha256, deep):
+    """Return None when the file matches, else a problem label."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return "missing"
+    if size is not None and st.st_size != size:
+        return "size_mismatch"
+    if deep and sha256:
+        try:
+            if sha256_file(path)[1] != sha256:
+                return "hash_mismatch"
+        except OSError:
+            return "unreadable"
+    return None
+
+def _checks(manifest, export_dir):
+    for sh in manifest.get("shards", []):
+        yield {"kind": "export", "file": sh["file"]}, os.path.join(export_dir, sh["file"]), sh.get("size"), sh.get("sha256")
+    for att in manifest.get("attachments", []):
+        if att.get("status") != "copied": continue
+        yield {"kind": "attachment", "file": att["path"], "row_id": att.get("row_id")}, os.path.join(export_dir, att["path"]), att.get("size"), att.get("sha256")
+
+def verify_manifest(manifest_path, deep=True, workers=VERIFY_WORKERS):
+    """Re-check an export directory against one manifest.
+
+    Files are checked in parallel with at most ``workers`` reads in flight, so
+    hashing hundreds of GB of media doesn't thrash the disk. ``deep=False`` only
+    compares sizes. Attachments that were already missing or failed to copy at
+    export time are reported under ``not_exported``.
+    """
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    export_dir = os.path.dirname(os.path.abspath(manifest_path))
+
+    problems = []
+    checked = 0
+    checks = _checks(manifest, export_dir)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        # Keep a bounded window of submissions instead of queueing every file up front.
+        for item, path, size, sha256 in checks:
+            pending[executor.submit(_check_file, path, size, sha256, deep)] = item
+            if len(pending) >= workers * 4:
+                finished, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for fut in finished:
+                    item = pending.pop(fut)
+                    checked += 1
+                    problem = fut.result()
+                    if problem: problems.append(dict(item, problem=problem))
+        for fut in concurrent.futures.as_completed(pending):
+            item = pending[fut]
+            checked += 1
+            problem = fut.result()
+            if problem: problems.append(dict(item, problem=problem))
+
+    not_exported = [
+        {"row_id": a.get("row_id"), "source": os.path.basename(a.get("source") or ""), "status": a.get("status")}
+        for a in manifest.get("attachments", []) if a.get("status") != "copied"
+    ]
+    return {
+        "manifest": os.path.basename(manifest_path),
+        "chat_guid": manifest.get("chat_guid"),
+        "deep": deep,
+        "checked": checked,
+        "ok": not problems,
+        "problems": sorted(problems, key=lambda p: (p["kind"], p["file"])),
+        "not_exported": not_exported,
+    }
+
+def verify_export(path, deep=True, workers=VERIFY_WORKERS):
+    """Verify a manifest file, or every ``*.manifest.json`` directly inside a directory."""
+    if os.path.isdir(path):
+        manifests = sorted(os.path.join(path, n) for n in os.listdir(path) if n.endswith(".manifest.json"))
+    else:
+        manifests = [path]
+    if not manifests:
+        raise FileNotFoundError("No export manifest found")
+    return [verify_manifest(m, deep=deep, workers=workers) for m in manifests]
+
+if __name__ == "__main__":
+    # python3 -m backend.src.verify <export dir or manifest> [--quick]
+    reports = verify_export(sys.argv[1], deep="--quick" not in sys.argv[2:])
+    for report in reports:
+        print(f"{'OK  ' if report['ok'] else 'FAIL'} {report['manifest']}: {report['checked']} files checked, "
+              f"{len(report['problems'])} problems, {len(report['not_exported'])} attachments not exported")
+        for p in report["problems"]: print(f"       {p['problem']}: {p['file']}")
+    sys.exit(0 if all(r["ok"] for r in reports) else 1)
@@ -0,0 +1,138 @@
+import asyncio
+import os
+import sqlite3
+from .config import DEFAULT_DB_PATH, TMP_DB, REACTION_MAP
+from .helpers import decode_body, mac_timestamp_to_iso, redact_path, parse_associated_guid
+from .db import get_handle_map, resolve_name
+from .query import run_query, run_query_one, register_hot_query
+from .records import record_factory
+
+POLL_INTERVAL = 0.5 # seconds; new messages reach subscribers within about one interval
+MAX_BATCH = 500
+
+NEW_MESSAGES_SQL = register_hot_query("watcher.new_messages", """
+    SELECT m.ROWID as row_id, m.guid, m.text, m.attributedBody, m.is_from_me, m.date, h.id as handle_id, c.guid as chat_guid,
+           m.associated_message_type, m.associated_message_guid, m.thread_originator_guid
+    FROM message m
+    JOIN chat_message_join cmj ON m.ROWID = cmj.message_id
+    JOIN chat c ON cmj.chat_id = c.ROWID
+    LEFT JOIN handle h ON m.handle_id = h.ROWID
+    WHERE m.ROWID > ?
+    ORDER BY m.ROWID ASC LIMIT ?
+    """, (0, MAX_BATCH))
+
+def get_source_db_path():
+    """The live Messages database (falls back to TMP_DB when running off a copy)."""
+    if os.path.exists(DEFAULT_DB_PATH): return DEFAULT_DB_PATH
+    return TMP_DB or DEFAULT_DB_PATH
+
+def _stat_signature(path):
+    sig = []
+    for p in (path, path + "-wal"):
+        try:
+            st = os.stat(p)
+            sig.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append(None)
+    return tuple(sig)
+
+class MessageWatcher:
+    """Detects new rows in the source chat.db and fans them out to subscribers.
+
+    Each poll is a stat() of chat.db and its WAL; only when those change does it
+    consult ``PRAGMA data_version`` and read rows past the last seen ROWID.
+    """
+
+    def __init__(self, db_path=None, interval=POLL_INTERVAL):
+        self.db_path = db_path
+        self.interval = interval
+        self._conn = None
+        self._sig = None
+        self._data_version = None
+        self._last_rowid = None
+        self._h_map = None
+        self._subscribers = {} # asyncio.Queue -> chat_guid filter (None = all chats)
+        self._task = None
+
+    def _connect(self):
+        if self._conn is None:
+            path = self.db_path or get_source_db_path()
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            self._conn.row_factory = record_factory
+            self.db_path = path
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def poll(self):
+        """Return message dicts added since the previous poll (blocking; run off the event loop)."""
+        conn = self._connect()
+        if self._last_rowid is None:
+            self._last_rowid = run_query_one(conn, "SELECT COALESCE(MAX(ROWID), 0) FROM message", name="watcher.max_rowid")[0]
+            self._sig = _stat_signature(self.db_path)
+            self._data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            return []
+
+        sig = _stat_signature(self.db_path)
+        if sig == self._sig: return []
+        self._sig = sig
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version: return []
+        self._data_version = data_version
+
+        results = []
+        while True:
+            rows = run_query(conn, NEW_MESSAGES_SQL, (self._last_rowid, MAX_BATCH), name="watcher.new_messages")
+            if not rows: break
+            if self._h_map is None: self._h_map = get_handle_map()
+            for r in rows:
+                reaction = REACTION_MAP.get(r.associated_message_type or 0, "")
+                results.append({
+                    "chat_guid": r.chat_guid,
+                    "row_id": r.row_id,
+                    "text": decode_body(r.text, r.attributedBody) or "",
+                    "is_from_me": bool(r.is_from_me),
+                    "date": mac_timestamp_to_iso(r.date),
+                    "handle_id": r.handle_id,
+                    "sender_name": "Me" if r.is_from_me else resolve_name(r.handle_id, self._h_map),
+                    "guid": r.guid,
+                    "reaction_type": reaction,
+                    "reaction_target": parse_associated_guid(r.associated_message_guid) if reaction else "",
+                    "reactions": {}, # a brand-new message has none yet; tapbacks arrive as their own events
+                    "thread_id": r.thread_originator_guid or "",
+                })
+            self._last_rowid = rows[-1].row_id
+            if len(rows) < MAX_BATCH: break
+        return results
+
+    def subscribe(self, chat_guid=None):
+        queue = asyncio.Queue()
+        self._subscribers[queue] = chat_guid
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.pop(queue, None)
+
+    async def _run(self):
+        try:
+            while self._subscribers:
+                try:
+                    messages = await asyncio.to_thread(self.poll)
+                except sqlite3.Error as e:
+                    # Messages.app may hold a write lock or rotate the WAL; reopen next round.
+                    print(f"Watcher poll failed: {redact_path(str(e))}")
+                    self.close()
+                    messages = []
+                for msg in messages:
+                    for queue, chat_guid in list(self._subscribers.items()):
+                        if chat_guid is None or chat_guid == msg["chat_guid"]:
+                            queue.put_nowait(msg)
+                await asyncio.sleep(self.interval)
+        finally:
+            self.close()
+            self._last_rowid = None
@@ -47,5 +47,12 @@ export const api = {
     },
     getSystemStatus: async () => {
         return await fetchJson('/system/status');
+    },
+    subscribeMessages: (onMessage: (message: any) => void, chatGuid?: string) => {
+        const query = chatGuid ? `?chat_guid=${encodeURIComponent(chatGuid)}` : '';
+        const socket = new WebSocket(`${API_BASE.replace(/^http/, 'ws')}/ws/messages${query}`);
+        socket.onmessage = (event) => onMessage(JSON.parse(event.data));
+        socket.onerror = () => console.error('Live message feed error');
+        return () => socket.close();
     }
 };